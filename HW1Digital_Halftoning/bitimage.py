@@ -0,0 +1,128 @@
+import struct
+import zlib
+import numpy as np
+
+
+class PackedBinaryImage:
+    """
+    1-bit image (H x W) or stack of images (N x H x W) with each row packed
+    8 pixels per byte, most significant bit first. A set bit is white (255).
+    """
+
+    def __init__(self, bits, width):
+        self.bits = bits
+        self.width = width
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(np.packbits(mask, axis=-1), mask.shape[-1])
+
+    @classmethod
+    def from_image(cls, img, threshold=128):
+        """
+        Pack an 8-bit image, white where the pixel is above `threshold`.
+        """
+        return cls.from_mask(np.greater(img, threshold))
+
+    @property
+    def shape(self):
+        return self.bits.shape[:-1] + (self.width,)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def __len__(self):
+        return self.bits.shape[0]
+
+    def __getitem__(self, index):
+        """
+        Packed view of frames (or rows) of the image; no bits are copied.
+        """
+        return PackedBinaryImage(self.bits[index], self.width)
+
+    def mask(self):
+        return np.unpackbits(self.bits, axis=-1, count=self.width).view(bool)
+
+    def unpack(self, value=255):
+        """
+        Dense uint8 image with white pixels set to `value`.
+        """
+        dense = np.unpackbits(self.bits, axis=-1, count=self.width)
+        dense *= value
+        return dense
+
+
+def _check_single(image):
+    if image.bits.ndim != 2:
+        raise ValueError("only a single H x W image can be written to a file")
+
+
+def write_pbm(path, image):
+    """
+    Write a packed image as binary PBM (P4). PBM stores black as 1, so the bits are inverted.
+    """
+    _check_single(image)
+    height = image.bits.shape[0]
+    with open(path, 'wb') as f:
+        f.write(b'P4\n%d %d\n' % (image.width, height))
+        f.write(np.invert(image.bits).tobytes())
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+
+def write_png(path, image, level=6):
+    """
+    Write a packed image as a 1-bit grayscale PNG.
+    """
+    _check_single(image)
+    height, row_bytes = image.bits.shape
+    scanlines = np.zeros((height, row_bytes + 1), dtype=np.uint8)  # filter type 0 per row
+    scanlines[:, 1:] = image.bits
+
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', image.width, height, 1, 0, 0, 0, 0)))
+        f.write(_png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), level)))
+        f.write(_png_chunk(b'IEND', b''))
+
+
+def _read_pbm_header(f):
+    fields = []
+    while len(fields) < 3:
+        line = f.readline()
+        if not line:
+            raise ValueError("truncated PBM header")
+        fields += line.split(b'#')[0].split()
+    if fields[0] != b'P4':
+        raise ValueError("not a binary PBM (P4) file")
+    return int(fields[2]), int(fields[1])
+
+
+def read_pbm(path):
+    with open(path, 'rb') as f:
+        height, width = _read_pbm_header(f)
+        bits = np.frombuffer(f.read(height * ((width + 7) // 8)), dtype=np.uint8)
+    return PackedBinaryImage(np.invert(bits).reshape(height, -1), width)
+
+
+def read_pbm_batch(paths):
+    """
+    Read same-sized PBM files straight into one packed N x H x W stack.
+    """
+    if not paths:
+        raise ValueError("no PBM files given")
+    images = None
+    for i, path in enumerate(paths):
+        with open(path, 'rb') as f:
+            height, width = _read_pbm_header(f)
+            if images is None:
+                images = PackedBinaryImage(np.empty((len(paths), height, (width + 7) // 8), dtype=np.uint8), width)
+            elif images.shape[1:] != (height, width):
+                raise ValueError(f"{path} is {width}x{height}, expected {images.width}x{images.bits.shape[1]}")
+            if f.readinto(memoryview(images.bits[i]).cast('B')) != images.bits[i].nbytes:
+                raise ValueError(f"{path} is truncated")
+    np.invert(images.bits, out=images.bits)
+    return images
@@ -0,0 +1,96 @@
+import os
+import numpy as np
+
+mask_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'masks')
+_masks = {}
+
+
+def _toroidal_gaussian(size, sigma):
+    """
+    Gaussian on a size x size torus, tiled 2 x 2 so that the kernel centred on (y, x)
+    is the view [size - y:2 * size - y, size - x:2 * size - x].
+    """
+    d = np.minimum(np.arange(size), size - np.arange(size))
+    g = np.exp(-(d[:, None] ** 2 + d[None, :] ** 2) / (2 * sigma ** 2))
+    return g, np.tile(g, (2, 2))
+
+
+def void_and_cluster(size=64, sigma=1.5, seed=0):
+    """
+    Void-and-cluster blue-noise rank matrix (values 0 .. size^2 - 1).
+    Energies are kept up to date incrementally by adding or removing one shifted
+    Gaussian per toggled pixel.
+    """
+    n = size * size
+    g, tiled = _toroidal_gaussian(size, sigma)
+
+    def kernel_at(index):
+        y, x = divmod(index, size)
+        return tiled[size - y:2 * size - y, size - x:2 * size - x].ravel()
+
+    rng = np.random.default_rng(seed)
+    pattern = np.zeros(n, dtype=bool)
+    pattern[rng.choice(n, max(1, n // 10), replace=False)] = True
+    energy = np.real(np.fft.ifft2(np.fft.fft2(pattern.reshape(size, size)) * np.fft.fft2(g))).ravel()
+
+    # initial binary pattern: move the tightest cluster into the largest void until stable
+    while True:
+        cluster = np.argmax(np.where(pattern, energy, -np.inf))
+        pattern[cluster] = False
+        energy -= kernel_at(cluster)
+        void = np.argmin(np.where(pattern, np.inf, energy))
+        pattern[void] = True
+        energy += kernel_at(void)
+        if void == cluster:
+            break
+
+    ranks = np.empty(n, dtype=np.uint16 if n <= 65536 else np.uint32)
+    ones = np.count_nonzero(pattern)
+
+    # phase 1: remove clusters from the prototype, ranking down from ones - 1
+    p, e = pattern.copy(), energy.copy()
+    for rank in range(ones - 1, -1, -1):
+        cluster = np.argmax(np.where(p, e, -np.inf))
+        p[cluster] = False
+        e -= kernel_at(cluster)
+        ranks[cluster] = rank
+
+    # phase 2: fill voids of the prototype, ranking up from ones
+    p, e = pattern, energy
+    for rank in range(ones, n):
+        void = np.argmin(np.where(p, np.inf, e))
+        p[void] = True
+        e += kernel_at(void)
+        ranks[void] = rank
+
+    return ranks.reshape(size, size)
+
+
+def blue_noise_mask(size=64, seed=0, cache_dir=None):
+    """
+    Blue-noise rank matrix of the given size, generated once and cached on disk.
+    Cached masks are memory-mapped on load and kept for the rest of the process.
+    """
+    cache_dir = mask_cache_dir if cache_dir is None else cache_dir
+    path = os.path.join(cache_dir, f'bluenoise_{size}_{seed}.npy')
+    if path in _masks:
+        return _masks[path]
+
+    if not os.path.exists(path):
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        mask = void_and_cluster(size, seed=seed)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, mask)
+        os.replace(tmp_path, path)
+
+    _masks[path] = np.load(path, mmap_mode='r')
+    return _masks[path]
+
+
+def clear_cache():
+    """
+    Forget the masks loaded so far; the files in the cache directory are kept.
+    """
+    _masks.clear()
@@ -1,61 +1,126 @@
+import os
 import sys
+import hashlib
+from collections import OrderedDict
 import cv2 as cv
 import numpy as np
 import matplotlib as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mmap_io import open_image, create_image, row_strips
+import metrics
+from bitimage import PackedBinaryImage
+import bluenoise
+
+_threshold_map_cache = OrderedDict()
+_threshold_map_cache_bytes = 0
+threshold_map_cache_limit = 64 * 1024 * 1024  # bytes kept in the tiled threshold map cache
+
+
 def generate_bayer_matrix(n):
     if n == 1:
         return np.array([[0, 2], [3, 1]])
     else:
-        smaller_matrix = generate_bayer_matrix(n - 1)
-        size = 2 ** n
-        new_matrix = np.zeros((size, size), dtype=int)
-        for i in range(2 ** (n - 1)):
-            for j in range(2 ** (n - 1)):
-                base_value = 4 * smaller_matrix[i, j]
-                new_matrix[i, j] = base_value
-                new_matrix[i, j + 2 ** (n - 1)] = base_value + 2
-                new_matrix[i + 2 ** (n - 1), j] = base_value + 3
-                new_matrix[i + 2 ** (n - 1), j + 2 ** (n - 1)] = base_value + 1
-        return new_matrix
+        base = 4 * generate_bayer_matrix(n - 1)
+        return np.block([[base, base + 2], [base + 3, base + 1]])
         
 
 def generate_thresholds_matrix(bayer_matrix):
     # TODO:Calculate each bayer matrix element threshold
     N = bayer_matrix.shape[0]
-    thresholds_matrix = np.zeros_like(bayer_matrix, int)
-
-    for i in range(N):
-        for j in range(N):
-            thresholds_matrix[i,j] = (255*(bayer_matrix[i,j]+0.5))/(N**2)
+    thresholds_matrix = ((255 * (bayer_matrix + 0.5)) / (N ** 2)).astype(int)
 
     return thresholds_matrix
 
 
-def Ordered_Dithering(img, thresholds_matrix):
-    # TODO:Implementing the ordered dithering algorithm
-    N = thresholds_matrix.shape[0]
-    Ordered_Dithering_img = np.zeros_like(img,np.uint8)
-    height,width = img.shape
+def tile_threshold_map(thresholds_matrix, height, width, key=None):
+    """
+    Tile the threshold matrix over a height x width frame.
+    Tiled maps are stored in the smallest dtype that holds the thresholds (uint8 for
+    0..255) and kept in an LRU cache bounded by threshold_map_cache_limit bytes,
+    keyed by `key` (defaults to a digest of the matrix) and the frame size.
+    """
+    global _threshold_map_cache_bytes
+    if key is None:
+        key = (thresholds_matrix.shape, hashlib.sha1(np.ascontiguousarray(thresholds_matrix)).hexdigest())
+    cache_key = (key, height, width)
+
+    threshold_map = _threshold_map_cache.get(cache_key)
+    if threshold_map is not None:
+        _threshold_map_cache.move_to_end(cache_key)
+        return threshold_map
+
+    N, M = thresholds_matrix.shape
+    reps = (-(-height // N), -(-width // M))
+    dtype = thresholds_matrix.dtype
+    if thresholds_matrix.size and np.issubdtype(dtype, np.integer):
+        dtype = np.result_type(np.min_scalar_type(thresholds_matrix.min()), np.min_scalar_type(thresholds_matrix.max()))
+    # a contiguous copy, so that nbytes is what the cache actually holds
+    threshold_map = np.tile(thresholds_matrix.astype(dtype), reps)[:height, :width].copy()
+    threshold_map.setflags(write=False)
+
+    if threshold_map.nbytes <= threshold_map_cache_limit:
+        _threshold_map_cache[cache_key] = threshold_map
+        _threshold_map_cache_bytes += threshold_map.nbytes
+        while _threshold_map_cache_bytes > threshold_map_cache_limit:
+            _, evicted = _threshold_map_cache.popitem(last=False)
+            _threshold_map_cache_bytes -= evicted.nbytes
 
-    for i in range(0,img.shape[0],N):
-        for j in range(0,img.shape[1],N):
-            for k in range(N):
-                for l in range(N):
-                    if (i + k < height and j + l < width):
-                        if(img[i+k,j+l]>thresholds_matrix[k,l]):
-                            Ordered_Dithering_img[i+k,j+l] = 255
-                        else:
-                            Ordered_Dithering_img[i+k,j+l] = 0
+    return threshold_map
+
+
+def clear_caches():
+    """
+    Empty the tiled threshold map cache and the loaded blue-noise masks.
+    """
+    global _threshold_map_cache_bytes
+    _threshold_map_cache.clear()
+    _threshold_map_cache_bytes = 0
+    bluenoise.clear_cache()
+
+
+def threshold_map(n, height, width):
+    """
+    Tiled threshold map of the 2^n x 2^n Bayer matrix for a height x width frame.
+    """
+    thresholds_matrix = generate_thresholds_matrix(generate_bayer_matrix(n))
+    return tile_threshold_map(thresholds_matrix, height, width, key=('bayer', n))
+
+
+def Ordered_Dithering(img, thresholds_matrix, packed=False):
+    """
+    Ordered dithering of a single image (H x W) or a stack of images (N x H x W).
+    `thresholds_matrix` is a threshold matrix or a Bayer order n.
+    packed=True returns a 1-bit PackedBinaryImage instead of 0/255 uint8.
+    """
+    height, width = img.shape[-2:]
+    if isinstance(thresholds_matrix, (int, np.integer)):
+        thresholds = threshold_map(thresholds_matrix, height, width)
+    else:
+        thresholds = tile_threshold_map(thresholds_matrix, height, width)
+
+    if packed:
+        return PackedBinaryImage.from_mask(np.greater(img, thresholds))
+
+    Ordered_Dithering_img = np.greater(img, thresholds).view(np.uint8)
+    Ordered_Dithering_img *= 255
 
     return Ordered_Dithering_img
 
-def Error_Diffusion(img,kernel=2):
-    # TODO:Implementing the error diffusion algorithm
-    Error_Diffusion_img = img.astype(float).copy()
-    height, width = img.shape
-    
-    
+def Blue_Noise_Dithering(img, size=64, packed=False):
+    """
+    Ordered dithering with a size x size void-and-cluster blue-noise mask
+    in place of the Bayer matrix.
+    """
+    thresholds_matrix = generate_thresholds_matrix(bluenoise.blue_noise_mask(size))
+    return Ordered_Dithering(img, thresholds_matrix, packed)
+
+
+def _diffusion_spec(kernel):
+    """
+    Diffusion taps (row offset, column offset, weight), weight divisor, the processed
+    column margins and the wavefront lag of an error diffusion kernel.
+    """
     if(kernel==2):
         '''
         kernel:
@@ -63,60 +128,188 @@ def Error_Diffusion(img,kernel=2):
         [   0  x  7
             3  5  1    ]
         '''
-        for i in range(height - 1):
-            for j in range(width - 1):
-                old_pixel = Error_Diffusion_img[i, j]
-
-                if( old_pixel > 128):
-                    new_pixel = 255
-                else:
-                    new_pixel = 0 
-
-                Error_Diffusion_img[i, j] = new_pixel
-                error = old_pixel - new_pixel
-
-                # diffusion
-                if(j+1<width):
-                    Error_Diffusion_img[i, j+1] += (error * 7) /16
-                if(i+1<height and j-1>=0):
-                    Error_Diffusion_img[i + 1, j - 1] += (error * 3) /16
-                if(i+1<height):
-                    Error_Diffusion_img[i+1, j] += (error * 5 )/16
-                if(i+1<height and j+1<width ):
-                    Error_Diffusion_img[i+1, j+1] += (error * 1) /16
-    else:
+        taps = [(0, 1, 7.0), (1, -1, 3.0), (1, 0, 5.0), (1, 1, 1.0)]
+        return taps, 16.0, (0, 1), 3
+
+    kernel = np.array([
+        [0,  0,  0,  7,  5],
+        [3,  5,  7,  5,  3],
+        [1,  3,  5,  3,  1]
+        ]) / 48.0
+    taps = [(ki, kj - 2, kernel[ki, kj]) for ki in range(3) for kj in range(5) if kernel[ki, kj] != 0]
+    return taps, None, (2, 2), 5
+
+
+def _diffuse_wavefront(buf, kernel, n_rows):
+    """
+    Error diffusion of rows [0, n_rows) of `buf` in place, as a wavefront.
+    Row i+1 trails row i by `lag` pixels, which is enough for every pixel to receive
+    its errors in raster order, so all rows on an anti-diagonal are quantized together
+    and the result is bit-exact with the raster scan.
+    Errors spill into the rows below n_rows, which must be present in `buf`.
+    """
+    taps, divisor, (col_start, trail), lag = _diffusion_spec(kernel)
+    col_stop = buf.shape[1] - trail
+    if n_rows <= 0 or col_stop <= col_start:
+        return buf
+
+    all_rows = np.arange(n_rows)
+    for t in range(col_start, col_stop + lag * (n_rows - 1)):
+        first = max(0, -(-(t - col_stop + 1) // lag))
+        last = min(n_rows - 1, (t - col_start) // lag)
+        if first > last:
+            # on images narrower than the lag some steps reach no row
+            continue
+        rows = all_rows[first:last + 1]
+        cols = t - lag * rows
+
+        old_pixel = buf[rows, cols]
+        new_pixel = np.where(old_pixel > 128, 255.0, 0.0)
+        buf[rows, cols] = new_pixel
+        error = old_pixel - new_pixel
 
-        kernel = np.array([
-            [0,  0,  0,  7,  5],
-            [3,  5,  7,  5,  3],
-            [1,  3,  5,  3,  1]
-            ]) / 48.0
+        # diffusion
+        for di, dj, weight in taps:
+            diffused = (error * weight) / divisor if divisor else error * weight
+            target_cols = cols + dj
+            if target_cols[-1] < 0:
+                valid = np.count_nonzero(target_cols >= 0)
+                buf[rows[:valid] + di, target_cols[:valid]] += diffused[:valid]
+            else:
+                buf[rows + di, target_cols] += diffused
 
+    return buf
 
-        for i in range(height - 2): 
-            for j in range(2, width - 2):
-                old_pixel = Error_Diffusion_img[i, j]
-                new_pixel = 255 if old_pixel > 128 else 0
 
-                Error_Diffusion_img[i, j] = new_pixel
-                error = old_pixel - new_pixel
+def _diffuse_serpentine(buf, kernel, n_rows, first_row=0):
+    """
+    Serpentine error diffusion of rows [0, n_rows) of `buf` in place.
+    Odd rows (counted from `first_row`) run right to left with the kernel mirrored.
+    Each row needs the whole previous row, so rows run one after another: the scan
+    along a row is a scalar loop carrying only the same-row taps, then the row's errors
+    reach the rows below with one vectorized add per tap, in the order the pixel scan
+    would add them, so the result is bit-exact with diffusing pixel by pixel.
+    """
+    taps, divisor, (col_start, trail), _ = _diffusion_spec(kernel)
+    height, width = buf.shape
+    col_stop = width - trail
+    if n_rows <= 0 or col_stop <= col_start:
+        return buf
 
-                for ki in range(3):
-                    for kj in range(-2, 3):
-                        ni, nj = i + ki, j + kj
-                        if 0 <= ni < height and 0 <= nj < width:
-                            Error_Diffusion_img[ni, nj] += error * kernel[ki, kj + 2]
+    row_taps = [(dj, weight) for di, dj, weight in taps if di == 0]
+    # for both scan directions, larger dj means an earlier source pixel
+    below_taps = sorted([tap for tap in taps if tap[0] > 0], key=lambda tap: -tap[1])
+    errors = np.empty(col_stop - col_start)
+
+    for i in range(n_rows):
+        reverse = (first_row + i) % 2 == 1
+        cols = range(col_stop - 1, col_start - 1, -1) if reverse else range(col_start, col_stop)
+        row = buf[i].tolist()
+        for j in cols:
+            old_pixel = row[j]
+            new_pixel = 255.0 if old_pixel > 128 else 0.0
+            row[j] = new_pixel
+            error = old_pixel - new_pixel
+            errors[j - col_start] = error
+
+            for dj, weight in row_taps:
+                nj = j - dj if reverse else j + dj
+                if 0 <= nj < width:
+                    row[nj] += (error * weight) / divisor if divisor else error * weight
+        buf[i] = row
+
+        for di, dj, weight in below_taps:
+            if i + di >= height:
+                continue
+            shift = -dj if reverse else dj
+            lo, hi = max(0, col_start + shift), min(width, col_stop + shift)
+            diffused = errors[lo - shift - col_start:hi - shift - col_start]
+            buf[i + di, lo:hi] += (diffused * weight) / divisor if divisor else diffused * weight
+
+    return buf
+
+
+def Error_Diffusion(img,kernel=2,serpentine=False,packed=False):
+    """
+    Error diffusion with the Floyd-Steinberg (kernel=2) or the 3x5 Jarvis-style kernel.
+    The raster scan runs as a wavefront over all rows at once; serpentine=True uses
+    the (sequential) boustrophedon scan instead.
+    packed=True returns a 1-bit PackedBinaryImage; the unscanned border pixels are
+    thresholded like the scanned ones.
+    """
+    Error_Diffusion_img = img.astype(float)
+    height = img.shape[0]
+    n_rows = height - 1 if kernel == 2 else height - 2
+
+    if serpentine:
+        _diffuse_serpentine(Error_Diffusion_img, kernel, n_rows)
+    else:
+        _diffuse_wavefront(Error_Diffusion_img, kernel, n_rows)
+
+    if packed:
+        return PackedBinaryImage.from_image(Error_Diffusion_img)
 
     return np.clip(Error_Diffusion_img, 0, 255).astype(np.uint8)
 
 
+def Ordered_Dithering_Stream(src, dst, thresholds_matrix, shape=None, strip_height=256):
+    """
+    Ordered dithering of a memory-mapped image strip by strip.
+    `src` is a .npy file, or a raw uint8 file of the given `shape`; `dst` is created
+    the same way. Peak memory is bounded by the strip height.
+    """
+    img = open_image(src, shape)
+    height, width = img.shape
+    output = create_image(dst, (height, width))
+
+    if isinstance(thresholds_matrix, (int, np.integer)):
+        N = 2 ** thresholds_matrix
+    else:
+        N = thresholds_matrix.shape[0]
+    # keep every strip in phase with the threshold matrix
+    strip_height = max(N, strip_height // N * N)
+
+    for start, stop in row_strips(height, strip_height):
+        output[start:stop] = Ordered_Dithering(img[start:stop], thresholds_matrix)
+
+    output.flush()
+    return output
+
+
+def Error_Diffusion_Stream(src, dst, kernel=2, shape=None, strip_height=256, serpentine=False):
+    """
+    Error diffusion of a memory-mapped image strip by strip, bit-exact with Error_Diffusion.
+    Only the one (kernel=2) or two rows of pending error below a strip are carried
+    into the next one, so peak memory is bounded by the strip height.
+    """
+    img = open_image(src, shape)
+    height, width = img.shape
+    output = create_image(dst, (height, width))
+
+    pending_rows = 1 if kernel == 2 else 2
+    last_row = height - pending_rows
+    carry = np.empty((0, width))
+
+    for start, stop in row_strips(height, strip_height):
+        buf = np.empty((min(height, stop + pending_rows) - start, width))
+        buf[:len(carry)] = carry
+        buf[len(carry):] = img[start + len(carry):start + len(buf)]
+
+        n_rows = max(0, min(stop, last_row) - start)
+        if serpentine:
+            _diffuse_serpentine(buf, kernel, n_rows, first_row=start)
+        else:
+            _diffuse_wavefront(buf, kernel, n_rows)
+
+        output[start:stop] = np.clip(buf[:stop - start], 0, 255).astype(np.uint8)
+        carry = buf[stop - start:].copy()
+
+    output.flush()
+    return output
+
+
 def calculate_PSNR(original, compressed):
-    mse = np.mean((original - compressed) ** 2)
-    if mse == 0:
-        return np.infty
-    max_pixel = 255.0
-    psnr = 10 * np.log10((max_pixel ** 2) / mse)
-    return psnr
+    return metrics.psnr(original, compressed)
 
 
 if __name__ == '__main__':
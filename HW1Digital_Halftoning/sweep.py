@@ -0,0 +1,141 @@
+import os
+import csv
+import json
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+import halftoning as ht
+import bitimage
+
+# seconds_warm: wall time of a run after an untimed warm-up (threshold maps and masks cached);
+# peak_bytes_cold: peak traced memory of a run with those caches cleared, so it includes them
+RESULT_FIELDS = ['image', 'algorithm', 'parameter', 'psnr', 'seconds_warm', 'peak_bytes_cold']
+
+ALGORITHMS = {
+    'ordered': lambda img, n: ht.Ordered_Dithering(img, n),
+    'error': lambda img, kernel: ht.Error_Diffusion(img, kernel),
+    'serpentine': lambda img, kernel: ht.Error_Diffusion(img, kernel, serpentine=True),
+    'blue-noise': lambda img, size: ht.Blue_Noise_Dithering(img, size),
+}
+
+_attached = {}
+
+
+def _attach(shm_name, shape, dtype):
+    """
+    View a shared input image; each worker attaches to a segment once.
+    """
+    if shm_name not in _attached:
+        _attached[shm_name] = shared_memory.SharedMemory(name=shm_name)
+    return np.ndarray(shape, dtype=dtype, buffer=_attached[shm_name].buf)
+
+
+def run_job(image_name, shm_name, shape, dtype, algorithm, parameter, out_dir=None, trace_memory=True):
+    """
+    Halftone one shared image and measure PSNR, wall time and peak traced memory.
+    The time is that of a warm run, after an untimed one has filled the threshold map
+    and blue-noise caches; the peak comes from a separate traced run (tracing slows
+    allocation-heavy code down) with the caches cleared, so it counts what they hold.
+    PSNR is measured on the 1-bit image that gets written (packing thresholds the border
+    pixels error diffusion leaves unscanned), also when no image is written.
+    """
+    img = _attach(shm_name, shape, dtype)
+    halftone = ALGORITHMS[algorithm]
+
+    output = halftone(img, parameter)
+    start = time.perf_counter()
+    halftone(img, parameter)
+    seconds = time.perf_counter() - start
+
+    peak_bytes = None
+    if trace_memory:
+        ht.clear_caches()
+        tracemalloc.start()
+        halftone(img, parameter)
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    packed = bitimage.PackedBinaryImage.from_image(output)
+    if out_dir is not None:
+        bitimage.write_png(os.path.join(out_dir, f'{image_name}_{algorithm}_{parameter}.png'), packed)
+
+    return {
+        'image': image_name,
+        'algorithm': algorithm,
+        'parameter': parameter,
+        'psnr': float(ht.calculate_PSNR(img, packed.unpack())),
+        'seconds_warm': seconds,
+        'peak_bytes_cold': peak_bytes,
+    }
+
+
+def _job_key(image_name, algorithm, parameter):
+    return (str(image_name), str(algorithm), str(parameter))
+
+
+def load_results(results_path):
+    """
+    Rows of an existing CSV or JSON result table (empty if it does not exist yet).
+    """
+    if not os.path.exists(results_path):
+        return []
+    with open(results_path, newline='') as f:
+        if results_path.endswith('.json'):
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+
+def _append_result(results_path, rows, row):
+    rows.append(row)
+    if results_path.endswith('.json'):
+        with open(results_path, 'w') as f:
+            json.dump(rows, f, indent=2)
+    else:
+        new_file = not os.path.exists(results_path)
+        with open(results_path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+
+
+def run_sweep(images, jobs, results_path, out_dir=None, max_workers=None, trace_memory=True):
+    """
+    Run (image name, algorithm, parameter) jobs on a process pool.
+    `images` maps names to grayscale arrays, which are shared with the workers through
+    shared memory instead of being pickled per task. Results go to a CSV or JSON table;
+    jobs already in the table are skipped. Returns all rows of the table.
+    """
+    rows = load_results(results_path)
+    done = {_job_key(row['image'], row['algorithm'], row['parameter']) for row in rows}
+    pending = [job for job in jobs if _job_key(*job) not in done]
+    if not pending:
+        return rows
+
+    if out_dir is not None and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    segments = {}
+    try:
+        for name in {job[0] for job in pending}:
+            img = np.ascontiguousarray(images[name])
+            shm = shared_memory.SharedMemory(create=True, size=max(1, img.nbytes))
+            np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)[...] = img
+            segments[name] = (shm, img.shape, img.dtype.str)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for name, algorithm, parameter in pending:
+                shm, shape, dtype = segments[name]
+                futures.append(executor.submit(run_job, name, shm.name, shape, dtype, algorithm, parameter,
+                                               out_dir, trace_memory))
+            for future in as_completed(futures):
+                _append_result(results_path, rows, future.result())
+    finally:
+        for shm, _, _ in segments.values():
+            shm.close()
+            shm.unlink()
+
+    return rows
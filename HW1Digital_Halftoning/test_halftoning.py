@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import halftoning as ht
+
+
+def _reference_error_diffusion(img, kernel):
+    """
+    Raster scan, one pixel at a time, as the original Error_Diffusion did it.
+    """
+    taps, divisor, (col_start, trail), _ = ht._diffusion_spec(kernel)
+    buf = img.astype(float)
+    height, width = buf.shape
+    n_rows = height - 1 if kernel == 2 else height - 2
+    for i in range(n_rows):
+        for j in range(col_start, width - trail):
+            old_pixel = buf[i, j]
+            new_pixel = 255.0 if old_pixel > 128 else 0.0
+            buf[i, j] = new_pixel
+            error = old_pixel - new_pixel
+            for di, dj, weight in taps:
+                ni, nj = i + di, j + dj
+                if ni < height and 0 <= nj < width:
+                    buf[ni, nj] += (error * weight) / divisor if divisor else error * weight
+    return np.clip(buf, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('kernel', [2, 3])
+@pytest.mark.parametrize('width', range(1, 11))
+def test_error_diffusion_matches_raster_scan_on_narrow_images(kernel, width):
+    img = np.random.default_rng(width).integers(0, 256, (9, width)).astype(np.uint8)
+    np.testing.assert_array_equal(ht.Error_Diffusion(img, kernel), _reference_error_diffusion(img, kernel))
+
+
+@pytest.mark.parametrize('kernel', [2, 3])
+@pytest.mark.parametrize('width', [1, 2, 3, 5, 8])
+def test_error_diffusion_stream_on_narrow_images(tmp_path, kernel, width):
+    img = np.random.default_rng(width).integers(0, 256, (23, width)).astype(np.uint8)
+    np.save(tmp_path / 'src.npy', img)
+    ht.Error_Diffusion_Stream(str(tmp_path / 'src.npy'), str(tmp_path / 'dst.npy'), kernel, strip_height=4)
+    np.testing.assert_array_equal(np.load(tmp_path / 'dst.npy'), _reference_error_diffusion(img, kernel))
@@ -4,43 +4,60 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
 import os
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import threading
+import queue
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
+from mmap_io import open_image, create_image, row_strips
+
 save_lock = threading.Lock()
 
 output_dir = './HW2Histogram_Equalization/output_images'
+histogram_dir = './HW2Histogram_Equalization/histogram'
 
 def Generate_Histogram(img):
-    frequency = [0]*256
+    return np.bincount(np.asarray(img).ravel(), minlength=256)
+
+
+def Generate_Histograms(images):
+    """
+    Histograms of many images or tiles in one pass, as an (N, 256) array.
+    `images` is an N x ... uint8 array or a list of uint8 arrays of any sizes.
+    """
+    if isinstance(images, np.ndarray):
+        values = images.reshape(len(images), -1) + (np.arange(len(images)) * 256)[:, None]
+        return np.bincount(values.ravel(), minlength=len(images) * 256).reshape(-1, 256)
+
+    frequencies = np.empty((len(images), 256), dtype=np.intp)
+    for k, area in enumerate(images):
+        frequencies[k] = np.bincount(np.asarray(area).ravel(), minlength=256)
+    return frequencies
+
+
+def Cumulative_Distribution_Funcs(frequencies, num_pixels, local=False):
+    """
+    Equalization LUTs (N, 256) of uint8 for a batch of histograms (N, 256).
+    `num_pixels` is a scalar or one pixel count per histogram.
+    """
+    num_pixels = np.asarray(num_pixels, dtype=float)
+    if num_pixels.ndim:
+        num_pixels = num_pixels[:, None]
+    cdf = np.cumsum(frequencies / num_pixels, axis=-1)
+    if local:
+        np.minimum(cdf, 1, out=cdf)
 
-    for i in range(img.shape[0]):
-        for j in range(img.shape[1]):
-            frequency[img[i,j]]  +=1 
+    ##normalize
+    return np.round(cdf * 255).astype(np.uint8)
 
-    return frequency
 
 def Cumulative_Distribution_Func(frequency,num_pixels,local=False):
-    cdf=[0.0]*256
-    cdf_normalize=[0]*256
-
-    for i in range(256):
-        if(i==0):
-            cdf[0] = frequency[0] / num_pixels
-        else:
-            if(local):
-                cdf[i] = min(1,cdf[i-1] + frequency[i] / num_pixels )
-            else:
-                cdf[i] = cdf[i-1] + frequency[i] / num_pixels  
-
-    cdf_min = min([x for x in cdf if x > 0])
-    
-    ##normalize
-    for i in range(256):
-        cdf_normalize[i] = np.round(cdf[i]*255).astype(np.uint8)
+    return Cumulative_Distribution_Funcs(np.asarray(frequency)[None], num_pixels, local)[0]
 
-    return cdf_normalize
 
-def draw_historgram(origin,save=None,after=None):
+def histogram_figure(origin,after=None):
     fig = Figure()
     ax = fig.add_subplot(111)
 
@@ -55,9 +72,14 @@ def draw_historgram(origin,save=None,after=None):
     ax.set_ylabel('Frequency')
     ax.legend(loc="upper right")
 
+    return fig
+
+
+def draw_historgram(origin,save=None,after=None):
+    fig = histogram_figure(origin, after)
+
     if save is not None:
         with save_lock:
-            histogram_dir = './HW2Histogram_Equalization/histogram'
             if not os.path.exists(histogram_dir):
                 os.makedirs(histogram_dir)
             if save == 0:
@@ -70,11 +92,70 @@ def draw_historgram(origin,save=None,after=None):
     plt.close(fig)
 
 
-def Global_HE(img):
+class OutputWriter:
+    """
+    Background writer for HE results. Images and histogram plots are queued and
+    rendered/saved on a worker thread, off the compute path; queueing blocks once
+    `max_pending` items are waiting. headless=True skips the plots entirely.
+    """
+
+    def __init__(self, max_pending=8, headless=False):
+        self.headless = headless
+        self.errors = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def image(self, path, img):
+        self._queue.put(('image', path, (img,)))
+
+    def histogram(self, path, origin, after=None):
+        if not self.headless:
+            self._queue.put(('histogram', path, (origin, after)))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                kind, path, args = item
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                if kind == 'image':
+                    cv.imwrite(path, *args)
+                else:
+                    fig = histogram_figure(*args)
+                    fig.savefig(path)
+                    plt.close(fig)
+            except Exception as e:
+                self.errors.append(e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until everything queued so far is written; re-raise the first write error.
+        """
+        self._queue.join()
+        if self.errors:
+            raise self.errors.pop(0)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def Global_HE(img, writer=None):
     #TODO:
     # step 1 : Count the number of pixel occurrences (hint : numpy --> unique())
-    new_img = np.zeros_like(img,dtype=np.uint8)
-
     height = img.shape[0]
     width = img.shape[1]
 
@@ -82,109 +163,379 @@ def Global_HE(img):
     cdf= Cumulative_Distribution_Func(freq,height*width)
 
     # step 2 : Calculate the histogram equalization
-
-    for i in range(height):
-        for j in range(width):
-            new_img[i,j] = cdf[img[i,j]]
+    new_img = cdf[img]
     
     # step 3 : Display histogram(comparison before and after equalization)
     new_freq=Generate_Histogram(new_img)
-    draw_historgram(freq,save=0,after=new_freq)
-
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    cv.imwrite(output_dir+'/'+'output_global.png', new_img)
-    print(f"PSNR_global: {calculate_PSNR(img,new_img)}")
-
-    return
-
 
-def Local_HE(img, size=7):
-    print(f"Starting Local HE with size {size}")
-    new_img = np.zeros_like(img,dtype=np.uint8)
-    height=img.shape[0]
-    width=img.shape[1]
+    if writer is not None:
+        writer.histogram(f'{histogram_dir}/histogram_global_inside.png', freq, after=new_freq)
+        writer.image(output_dir+'/'+'output_global.png', new_img)
+        print(f"PSNR_global: {calculate_PSNR(img,new_img)}")
+
+    return new_img, freq, new_freq
+
+
+def Sliding_Local_HE(img, size=7, row_start=0, row_stop=None):
+    """
+    Local HE of rows [row_start, row_stop) with a sliding window.
+    Per-column histograms of the window rows gain one image row and lose one per
+    output row, and the window histograms of a whole output row come from a prefix
+    sum over the columns, so the cost per pixel does not depend on the window size.
+    Border windows are clipped to the image as in Local_HE.
+    """
+    height, width = img.shape
+    row_stop = height if row_stop is None else row_stop
+    half_size = size // 2
+
+    columns = np.arange(width)
+    col_start = np.maximum(0, columns - half_size)
+    col_stop = np.minimum(width, columns + half_size + 1)
+
+    column_hist = np.zeros((width, 256), dtype=np.int32)
+    for r in range(max(0, row_start - half_size - 1), min(height, row_start + half_size)):
+        column_hist[columns, img[r]] += 1
+    prefix = np.zeros((width + 1, 256), dtype=np.int32)
+
+    new_rows = np.empty((row_stop - row_start, width), dtype=np.uint8)
+    for i in range(row_start, row_stop):
+        if i + half_size < height:
+            column_hist[columns, img[i + half_size]] += 1
+        if i - half_size - 1 >= 0:
+            column_hist[columns, img[i - half_size - 1]] -= 1
+
+        np.cumsum(column_hist, axis=0, out=prefix[1:])
+        freqs = prefix[col_stop] - prefix[col_start]
+        window_rows = min(height, i + half_size + 1) - max(0, i - half_size)
+        cdfs = Cumulative_Distribution_Funcs(freqs, window_rows * (col_stop - col_start), local=True)
+        new_rows[i - row_start] = cdfs[columns, img[i]]
+
+    return new_rows
+
+
+def _local_he_band(in_name, out_name, shape, size, band_start, band_stop):
+    """
+    Process worker: Local HE of one row band, read from and written to shared memory.
+    """
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        img = np.ndarray(shape, dtype=np.uint8, buffer=in_shm.buf)
+        new_img = np.ndarray(shape, dtype=np.uint8, buffer=out_shm.buf)
+        halo = size // 2
+        top = max(0, band_start - halo)
+        # the band plus a halo of size//2 rows holds every window of the band
+        band = img[top:min(shape[0], band_stop + halo)]
+        new_img[band_start:band_stop] = Sliding_Local_HE(band, size, band_start - top, band_stop - top)
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+def Parallel_Local_HE(img, size=7, workers=None, band_rows=None):
+    """
+    Local HE split into row bands on a process pool. Input and output live in shared
+    memory: workers read their band (with halo) and write their rows in place.
+    """
+    height, width = img.shape
+    workers = workers or os.cpu_count()
+    band_rows = band_rows or max(1, -(-height // (workers * 2)))
+
+    in_shm = shared_memory.SharedMemory(create=True, size=max(1, img.size))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, img.size))
+    try:
+        np.ndarray(img.shape, dtype=np.uint8, buffer=in_shm.buf)[...] = img
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_local_he_band, in_shm.name, out_shm.name, img.shape, size,
+                                       start, min(height, start + band_rows))
+                       for start in range(0, height, band_rows)]
+            for future in futures:
+                future.result()
+        new_img = np.ndarray(img.shape, dtype=np.uint8, buffer=out_shm.buf).copy()
+    finally:
+        in_shm.close()
+        in_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
 
-    half_size = size//2
-
-    for i in range(height):
-        for j in range(width):
-            area = img[max(0, i - half_size):min(height, i + half_size + 1), max(0, j - half_size):min(width, j + half_size + 1)]
-            freq = Generate_Histogram(area)
-            cdf = Cumulative_Distribution_Func(freq,area.size,local=True)
-            new_img[i, j] = cdf[img[i, j]]
-
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    return new_img
 
-    output_path = f"./HW2Histogram_Equalization/output_images/output_inside_local{size}.png"
-    cv.imwrite(output_path, new_img)
-    print(f"PSNR_local_{size}: {calculate_PSNR(img, new_img)}")
-    freq = Generate_Histogram(new_img)
-    draw_historgram(freq,save=size)
 
-    return new_img
+def Local_HE(img, size=7, workers=None, writer=None):
+    if workers:
+        new_img = Parallel_Local_HE(img, size, workers)
+    else:
+        new_img = Sliding_Local_HE(img, size)
 
+    freq = Generate_Histogram(img)
+    new_freq = Generate_Histogram(new_img)
 
-def Moments_Based_HE(img):
-    new_img = np.zeros_like(img, dtype=np.uint8)
+    if writer is not None:
+        writer.histogram(f'{histogram_dir}/histogram_local_{size}_inside.png', new_freq)
+        writer.image(f"{output_dir}/output_inside_local{size}.png", new_img)
+        print(f"PSNR_local_{size}: {calculate_PSNR(img, new_img)}")
+
+    return new_img, freq, new_freq
+
+
+def Integral_Histogram(img, bins=256):
+    """
+    Integral histogram index (H+1, W+1, bins): index[r, c] is the histogram of img[:r, :c].
+    Counts are uint16 whatever the image size: they wrap around, but a window histogram
+    is a difference of four of them, which is exact modulo 2^16 and so exact for any
+    window of fewer than 2^16 pixels. Coarser `bins` (a power of two) shrink it further.
+    """
+    if not isinstance(bins, (int, np.integer)) or bins < 2 or 256 % bins:
+        raise ValueError(f"bins must be a power of two between 2 and 256, got {bins!r}")
+    height, width = img.shape
+    values = img // (256 // bins)
+    columns = np.arange(width)
+
+    index = np.zeros((height + 1, width + 1, bins), dtype=np.uint16)
+    row_hist = np.zeros((width, bins), dtype=np.uint16)
+    for r in range(height):
+        row_hist[columns, values[r]] = 1
+        np.cumsum(row_hist, axis=0, out=index[r + 1, 1:])
+        index[r + 1, 1:] += index[r, 1:]
+        row_hist[columns, values[r]] = 0
+
+    return index
+
+
+def Local_HE_Multi(img, sizes, index=None):
+    """
+    Local HE for several window sizes against one integral histogram index.
+    Every window histogram is four lookups into the index, whatever its size.
+    With a coarse-binned index the CDF is interpolated linearly inside each bin.
+    Returns {size: new_img}.
+    """
+    if index is None:
+        index = Integral_Histogram(img)
+    height, width = img.shape
+    scale = 256 // index.shape[2]
+    values = img // scale
+    position = (img % scale + 1) / scale
+    columns = np.arange(width)
+
+    windows = {}
+    outputs = {}
+    for size in sizes:
+        half_size = size // 2
+        if min(2 * half_size + 1, height) * min(2 * half_size + 1, width) > np.iinfo(index.dtype).max:
+            raise ValueError(f"window size {size} is too large for a {index.dtype} integral histogram")
+        windows[size] = (np.maximum(0, columns - half_size), np.minimum(width, columns + half_size + 1))
+        outputs[size] = np.empty_like(img, dtype=np.uint8)
 
+    for i in range(height):
+        for size in sizes:
+            half_size = size // 2
+            r0, r1 = max(0, i - half_size), min(height, i + half_size + 1)
+            c0, c1 = windows[size]
+            # counts are exact modulo the dtype, so wrap-around cancels out
+            freqs = index[r1, c1] - index[r0, c1] - index[r1, c0] + index[r0, c0]
+            cdfs = Cumulative_Distribution_Funcs(freqs, (r1 - r0) * (c1 - c0), local=True)
+            if scale == 1:
+                outputs[size][i] = cdfs[columns, values[i]]
+            else:
+                upper = cdfs[columns, values[i]].astype(float)
+                lower = np.where(values[i] > 0, cdfs[columns, np.maximum(values[i] - 1, 0)], 0)
+                outputs[size][i] = np.round(lower + (upper - lower) * position[i])
+
+    return outputs
+
+
+def _tile_interpolation(length, edges):
+    """
+    For each pixel along one axis: the two nearest tile centres and the weight of the second.
+    """
+    centres = (edges[:-1] + edges[1:] - 1) / 2
+    position = np.arange(length)
+    first = np.clip(np.searchsorted(centres, position, side='right') - 1, 0, len(centres) - 1)
+    second = np.minimum(first + 1, len(centres) - 1)
+    span = np.where(second > first, centres[second] - centres[first], 1)
+    weight = np.clip((position - centres[first]) / span, 0, 1).astype(np.float32)
+    return first, second, weight
+
+
+def Tiled_HE(img, tiles=(8, 8), clip_limit=None, block_rows=64, writer=None):
+    """
+    Adaptive HE on a grid of tiles (CLAHE-style).
+    One LUT per tile is computed in a single batched pass, optionally clipping every bin
+    at clip_limit times the tile's mean bin count and spreading the excess evenly.
+    Each pixel blends the LUTs of its four nearest tile centres bilinearly.
+    """
+    height, width = img.shape
+    tiles_y, tiles_x = tiles
+    if not (1 <= tiles_y <= height and 1 <= tiles_x <= width):
+        raise ValueError(f"tiles {tuple(tiles)} must be between (1, 1) and the image shape {img.shape}")
+    row_edges = np.linspace(0, height, tiles_y + 1).astype(int)
+    col_edges = np.linspace(0, width, tiles_x + 1).astype(int)
+
+    areas = [img[row_edges[a]:row_edges[a + 1], col_edges[b]:col_edges[b + 1]]
+             for a in range(tiles_y) for b in range(tiles_x)]
+    tile_freqs = Generate_Histograms(areas)
+    freq = tile_freqs.sum(axis=0)  # the tiles partition the image
+    freqs = tile_freqs.astype(float)
+    counts = freqs.sum(axis=1)
+    if clip_limit is not None:
+        limit = np.maximum(1, clip_limit * counts / 256)[:, None]
+        excess = np.maximum(freqs - limit, 0).sum(axis=1)
+        freqs = np.minimum(freqs, limit) + excess[:, None] / 256
+    luts = Cumulative_Distribution_Funcs(freqs, counts, local=True).astype(np.float32)
+    luts = luts.reshape(tiles_y, tiles_x * 256)
+
+    y0, y1, wy = _tile_interpolation(height, row_edges)
+    x0, x1, wx = _tile_interpolation(width, col_edges)
+    x0, x1 = x0 * 256, x1 * 256
+
+    new_img = np.empty_like(img, dtype=np.uint8)
+    new_freq = np.zeros(256, dtype=np.intp)
+    for start in range(0, height, block_rows):
+        stop = min(height, start + block_rows)
+        # blend the two tile rows into one LUT row per image row first,
+        # so each pixel only needs two lookups instead of four
+        row_luts = luts[y0[start:stop]]
+        row_luts += (luts[y1[start:stop]] - row_luts) * wy[start:stop, None]
+        index = (np.arange(stop - start) * tiles_x * 256)[:, None] + img[start:stop]
+        row_luts = row_luts.ravel()
+
+        left = row_luts[index + x0]
+        left += (row_luts[index + x1] - left) * wx
+        new_img[start:stop] = np.round(left)
+        new_freq += np.bincount(new_img[start:stop].ravel(), minlength=256)
+
+    if writer is not None:
+        writer.histogram(f'{histogram_dir}/histogram_tiled_inside.png', freq, after=new_freq)
+        writer.image(output_dir + '/' + 'output_tiled.png', new_img)
+        print(f"PSNR_tiled: {calculate_PSNR(img, new_img)}")
+
+    return new_img, freq, new_freq
+
+
+def Moments_Based_HE(img, writer=None):
     mean_f = np.mean(img)
     std_f = np.std(img)
 
     mean_g = 128
     std_g = 64
 
-    for i in range(img.shape[0]):
-        for j in range(img.shape[1]):
-            new_pixel = (img[i, j] - mean_f) * (std_g / std_f) + mean_g
-            new_img[i, j] = np.clip(new_pixel, 0, 255)  # avoid overflow
-    
+    # the affine map only depends on the pixel value, so apply it as a LUT
+    new_values = (np.arange(256) - mean_f) * (std_g / std_f) + mean_g
+    lut = np.clip(new_values, 0, 255).astype(np.uint8)  # avoid overflow
+    new_img = lut[img]
 
     freq = Generate_Histogram(img)
     new_freq = Generate_Histogram(new_img)
-    draw_historgram(freq, save=1, after=new_freq)
 
+    if writer is not None:
+        writer.histogram(f'{histogram_dir}/histogram_local_1_inside.png', freq, after=new_freq)
+        writer.image(output_dir + '/' + 'output_moments.png', new_img)
+        print(f"PSNR_moments: {calculate_PSNR(img, new_img)}")
+
+    return new_img, freq, new_freq
+
+
+def _stream_histograms(img, chunk_rows):
+    """
+    Histogram of every row chunk of a (memory-mapped) image.
+    """
+    for start, stop in row_strips(img.shape[0], chunk_rows):
+        yield Generate_Histogram(img[start:stop])
+
+
+def _stream_lut(img, dst, lut, freq, chunk_rows):
+    """
+    Second pass: write lut[img] chunk by chunk. The output histogram follows from the input one.
+    """
+    output = create_image(dst, img.shape)
+    for start, stop in row_strips(img.shape[0], chunk_rows):
+        output[start:stop] = lut[img[start:stop]]
+    output.flush()
+
+    new_freq = np.bincount(lut, weights=freq, minlength=256).astype(np.int64)
+    return output, freq, new_freq
+
+
+def Global_HE_Stream(src, dst, shape=None, chunk_rows=1024):
+    """
+    Global HE of a memory-mapped image (.npy, or raw uint8 of the given `shape`) in two
+    passes over row chunks: accumulate the histogram, then apply the LUT into `dst`.
+    """
+    img = open_image(src, shape)
+    freq = np.zeros(256, dtype=np.int64)
+    for chunk_freq in _stream_histograms(img, chunk_rows):
+        freq += chunk_freq
+
+    cdf = Cumulative_Distribution_Func(freq, img.shape[0] * img.shape[1])
+    return _stream_lut(img, dst, cdf, freq, chunk_rows)
+
+
+def _merge_moments(a, b):
+    """
+    Merge (count, mean, M2) statistics of two chunks (Chan et al.'s parallel Welford update).
+    """
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    count = count_a + count_b
+    if count == 0:
+        return a
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+    return count, mean, m2
+
+
+def Moments_Based_HE_Stream(src, dst, shape=None, chunk_rows=1024):
+    """
+    Moments-based HE of a memory-mapped image in two passes: merge per-chunk mean and
+    variance, then apply the affine map as a LUT into `dst`.
+    """
+    img = open_image(src, shape)
+    values = np.arange(256)
+    freq = np.zeros(256, dtype=np.int64)
+    moments = (0, 0.0, 0.0)
+    for chunk_freq in _stream_histograms(img, chunk_rows):
+        freq += chunk_freq
+        count = int(chunk_freq.sum())
+        if count:
+            mean = np.dot(values, chunk_freq) / count
+            moments = _merge_moments(moments, (count, mean, np.dot(chunk_freq, (values - mean) ** 2)))
+
+    count, mean_f, m2 = moments
+    std_f = np.sqrt(m2 / count)
 
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    cv.imwrite(output_dir + '/' + 'output_moments.png', new_img)
-    print(f"PSNR_moments: {calculate_PSNR(img, new_img)}")
+    mean_g = 128
+    std_g = 64
 
-    return new_img
+    new_values = (values - mean_f) * (std_g / std_f) + mean_g
+    lut = np.clip(new_values, 0, 255).astype(np.uint8)
+    return _stream_lut(img, dst, lut, freq, chunk_rows)
 
 
 def calculate_PSNR(original, compressed):
-    mse = np.mean((original - compressed) ** 2)
-    if mse == 0:
-        return np.infty
-    max_pixel = 255.0
-    psnr = 10 * np.log10((max_pixel ** 2) / mse)
-    return psnr
-
-def process_with_different_sizes(img, size):
+    return metrics.psnr(original, compressed)
+
+def process_with_different_sizes(img, size, writer=None):
     # 進行 Local Histogram Equalization
-    new_img = Local_HE(img, size)
+    new_img, _, _ = Local_HE(img, size, writer=writer)
     print(f"Processed Local HE with size {size}")
     return new_img  
  
 if __name__ == '__main__':
     #img = cv.imread("./HW2Histogram_Equalization/images/inside.png", cv.IMREAD_GRAYSCALE)
     img = cv.imread("./HW2Histogram_Equalization/images/Lena.png", cv.IMREAD_GRAYSCALE)
-    #Global_HE(img)
-    enhanced_image = Moments_Based_HE(img)
+    with OutputWriter() as writer:
+        #Global_HE(img, writer)
+        enhanced_image, _, _ = Moments_Based_HE(img, writer)
 
-    '''
-    sizes = [7,11,15,17,31,41,51,71]
+        '''
+        sizes = [7,11,15,17,31,41,51,71]
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
         for size in sizes:
-            executor.submit(Local_HE, img, size)
-    
-    print("All tasks submitted.")
-    '''
+            Local_HE(img, size, workers=os.cpu_count(), writer=writer)
+        
+        print("All sizes processed.")
+        '''
 
     # TODO: Display histogram(comparison before and after equalization)
     
\ No newline at end of file
@@ -0,0 +1,141 @@
+import ctypes
+import os
+import time
+
+library_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Shared libraries next to this file: candidate file names and the symbols each must export
+LIBRARIES = {
+    'dwt': (('libdwt.so',), (
+        'dwt_2d', 'idwt_2d',
+        'dwt_2d_levels_batch', 'idwt_2d_levels_batch',
+        'dwt_2d_levels_batch_f', 'idwt_2d_levels_batch_f',
+    )),
+    'jpeg': (('libjpeg.so', 'libjpeg_image.so'), (
+        'jpeg_compress', 'jpeg_decompress',
+        'jpeg_encode_image', 'jpeg_max_encoded_size', 'jpeg_image_size', 'jpeg_decode_image', 'jpeg_set_num_threads',
+        'compress_image', 'decompress_image',
+    )),
+}
+
+_libraries = {}     # name -> CDLL, or None if it could not be loaded
+_configure = {}     # name -> callbacks run once on the loaded library
+load_errors = {}    # name -> why the library is unavailable
+
+_operations = {}    # operation -> {'numpy': f, 'native': f, 'library': name, 'sample': f}
+_chosen = {}        # operation -> backend name
+
+
+def _load(name):
+    filenames, symbols = LIBRARIES[name]
+    errors = []
+    for filename in filenames:
+        path = os.path.join(library_dir, filename)
+        if not os.path.exists(path):
+            errors.append(f"{filename} not found")
+            continue
+        try:
+            lib = ctypes.CDLL(path)
+        except OSError as e:
+            errors.append(f"{filename}: {e}")
+            continue
+        missing = [symbol for symbol in symbols if not hasattr(lib, symbol)]
+        if missing:
+            errors.append(f"{filename} does not export {', '.join(missing)}")
+            continue
+        return lib
+    load_errors[name] = '; '.join(errors)
+    return None
+
+
+def library(name):
+    """
+    The loaded shared library `name` (see LIBRARIES), or None if it is missing or
+    incomplete. It is loaded on first use only, from the directory of this file.
+    """
+    if name not in _libraries:
+        lib = _load(name)
+        _libraries[name] = lib
+        if lib is not None:
+            for configure in _configure.get(name, []):
+                configure(lib)
+    return _libraries[name]
+
+
+def require(name):
+    """
+    Like library(), but raises OSError if the library is unavailable.
+    """
+    lib = library(name)
+    if lib is None:
+        raise OSError(f"native library '{name}' is unavailable ({load_errors[name]}); "
+                      f"build it next to {__file__}")
+    return lib
+
+
+def on_load(name, configure):
+    """
+    Run configure(lib) (e.g. to set argtypes) once the library is loaded.
+    """
+    _configure.setdefault(name, []).append(configure)
+    if _libraries.get(name) is not None:
+        configure(_libraries[name])
+
+
+def register(operation, numpy, native=None, library=None, sample=None):
+    """
+    Register the NumPy and (optional) native implementation of an operation. Without a
+    `sample` the native one is used whenever its library loads and NumPy is only the
+    fallback. Pass `sample` (returning the arguments of a representative call) only if
+    both give bit-identical results: it is then used once to time them and keep the
+    faster one, which cannot change any output.
+    """
+    _operations[operation] = {'numpy': numpy, 'native': native, 'library': library, 'sample': sample}
+    _chosen.pop(operation, None)
+
+
+def _time(function, args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _choose(operation):
+    entry = _operations[operation]
+    if entry['native'] is None or library(entry['library']) is None:
+        return 'numpy'
+    if entry['sample'] is None:
+        return 'native'
+    args = entry['sample']()
+    timings = {name: _time(entry[name], args) for name in ('native', 'numpy')}
+    return min(timings, key=timings.get)
+
+
+def backend(operation):
+    """
+    Name of the backend ('native' or 'numpy') used for an operation, choosing it on first use.
+    """
+    if operation not in _chosen:
+        _chosen[operation] = _choose(operation)
+    return _chosen[operation]
+
+
+def set_backend(operation, name):
+    """
+    Force the backend of an operation; 'native' raises OSError if the library is unavailable.
+    """
+    if name == 'native':
+        require(_operations[operation]['library'])
+    elif name != 'numpy':
+        raise ValueError(f"unknown backend '{name}'")
+    _chosen[operation] = name
+
+
+def get(operation):
+    """
+    The implementation of an operation on the chosen backend.
+    """
+    return _operations[operation][backend(operation)]
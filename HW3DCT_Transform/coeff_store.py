@@ -0,0 +1,128 @@
+import json
+import struct
+import numpy as np
+from scipy.fft import idct, idctn
+
+from dct import block_view
+
+MAGIC = b'DCTSTORE'
+ALIGNMENT = 64
+
+
+def zigzag_indices(block_size=8):
+    """
+    Flat (row * block_size + col) indices of a block in JPEG zigzag order.
+    """
+    cells = [(i, j) for i in range(block_size) for j in range(block_size)]
+    cells.sort(key=lambda p: (p[0] + p[1], p[0] if (p[0] + p[1]) % 2 else -p[0]))
+    return np.array([i * block_size + j for i, j in cells])
+
+
+def _quantize(values, dtype):
+    if np.dtype(dtype) == np.int16:
+        peak = float(np.abs(values).max()) if values.size else 0.0
+        scale = peak / 32767 if peak > 0 else 1.0
+        return np.round(values / scale).astype(np.int16), scale
+    # a copy, so the store never keeps the full coefficient array alive through a view
+    return np.array(values, dtype=dtype, order='C'), None
+
+
+class CoefficientStore:
+    """
+    Compact store of truncated DCT coefficients.
+    'crop' keeps the retained crop_size corner of a global DCT, data shape (r, c);
+    'block' keeps the first `keep` zigzag coefficients of every block of a block DCT,
+    data shape (blocks_y, blocks_x, keep). Data is float32, or int16 with a scale.
+    """
+
+    def __init__(self, kind, shape, data, block_size=None, scale=None):
+        self.kind = kind
+        self.shape = tuple(shape)
+        self.data = data
+        self.block_size = block_size
+        self.scale = scale
+
+    @classmethod
+    def from_crop(cls, DCT_img, crop_size, dtype=np.float32):
+        data, scale = _quantize(DCT_img[:crop_size[0], :crop_size[1]], dtype)
+        return cls('crop', DCT_img.shape, data, scale=scale)
+
+    @classmethod
+    def from_blocks(cls, block_coeffs, shape, block_size=8, keep=10, dtype=np.float32):
+        """
+        Store the zigzag prefix of length `keep` of every block of Block_DCT output.
+        `shape` is the original image shape.
+        """
+        blocks = block_view(block_coeffs, block_size)
+        flat = blocks.reshape(blocks.shape[0], blocks.shape[1], block_size * block_size)
+        data, scale = _quantize(flat[:, :, zigzag_indices(block_size)[:keep]], dtype)
+        return cls('block', shape, data, block_size=block_size, scale=scale)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def values(self):
+        """
+        Retained coefficients as floats (dequantized if stored as int16).
+        """
+        if self.scale is None:
+            return np.asarray(self.data, dtype=np.float64)
+        return self.data * self.scale
+
+    def reconstruct(self):
+        """
+        Inverse transform straight from the retained coefficients, never building
+        the full-size coefficient array.
+        """
+        values = self.values()
+        height, width = self.shape
+        if self.kind == 'crop':
+            r, c = values.shape
+            basis_rows = idct(np.eye(height, r), axis=0, norm='ortho')
+            basis_cols = idct(np.eye(width, c), axis=0, norm='ortho')
+            return basis_rows @ values @ basis_cols.T
+
+        b = self.block_size
+        keep = values.shape[-1]
+        impulses = np.zeros((keep, b * b))
+        impulses[np.arange(keep), zigzag_indices(b)[:keep]] = 1
+        basis = idctn(impulses.reshape(keep, b, b), axes=(1, 2), norm='ortho')
+
+        img = np.empty((values.shape[0] * b, values.shape[1] * b))
+        block_view(img, b)[...] = np.tensordot(values, basis, axes=1)
+        return img[:height, :width]
+
+    def save(self, path):
+        """
+        Single file: magic, JSON header length, JSON header, then the raw data aligned
+        to 64 bytes so that load() can memory-map it.
+        """
+        header = json.dumps({
+            'kind': self.kind,
+            'shape': self.shape,
+            'block_size': self.block_size,
+            'scale': self.scale,
+            'dtype': self.data.dtype.str,
+            'data_shape': self.data.shape,
+        }).encode()
+        prefix = len(MAGIC) + 4 + len(header)
+        padding = -prefix % ALIGNMENT
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header) + padding) + header + b' ' * padding)
+            f.write(np.ascontiguousarray(self.data).tobytes())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a coefficient store")
+            header_length, = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_length))
+            offset = f.tell()
+            if not mmap:
+                data = np.frombuffer(f.read(), dtype=header['dtype']).reshape(header['data_shape'])
+        if mmap:
+            data = np.memmap(path, dtype=header['dtype'], mode='r', offset=offset,
+                             shape=tuple(header['data_shape']))
+        return cls(header['kind'], header['shape'], data, header['block_size'], header['scale'])
@@ -1,17 +1,17 @@
+import os
 import sys
 import cv2 as cv
 import numpy as np
 import math
 import matplotlib.pyplot as plt
-from scipy.fft import dct, idct
+from numpy.lib.stride_tricks import as_strided
+from scipy.fft import dct, idct, dctn, idctn
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import metrics
 
 def calculate_psnr(original, reconstructed):
-    mse = np.mean((original - reconstructed) ** 2)
-    if mse == 0:
-        return float('inf')
-    max_pixel = 255.0
-    psnr = 10 * np.log10((max_pixel ** 2) / mse)
-    return psnr
+    return metrics.psnr(original, reconstructed)
 
 def save_dct_as_image(dct_result, output_file):
     dct_visual = np.log(np.abs(dct_result) + 1)
@@ -21,43 +21,83 @@ def save_dct_as_image(dct_result, output_file):
     cv.imwrite(output_file, dct_visual)
     print(f"DCT saved: {output_file}")
 
-def Global_DCT(img):
+def Global_DCT(img, dtype=np.float64):
     # TODO:
         # 1. Use opencv’s DCT function or numpy’s fft function or Designed according to formula
         # EX: cv.dct(img) <--> cv.idct(img) 
-    dct_x = dct(img, type=2, axis=0, norm='ortho')
+    dct_x = dct(np.asarray(img, dtype=dtype), type=2, axis=0, norm='ortho')
     dct_xy = dct(dct_x, type=2, axis=1, norm='ortho')
 
     return dct_xy
 
-def Local_DCT(img, kernel_size = 8):
-    #TODO:
-        # 1. Use opencv’s DCT function or numpy’s fft2 function / Designed according to formula
-        # 2. Decide the core size by yourself (default 8 * 8)
+def block_view(img, block_size=8):
+    """
+    (H/b, W/b, b, b) view of the blocks of an image whose sides are multiples of b; no copy.
+    Other shapes raise ValueError rather than silently dropping the partial edge blocks.
+    """
     h, w = img.shape
-    dct_result = np.zeros_like(img, dtype=np.float32)  
+    if h % block_size or w % block_size:
+        raise ValueError(f"shape {img.shape} is not a multiple of the block size {block_size}; "
+                         f"use the padded output of Block_DCT")
+    s0, s1 = img.strides
+    return as_strided(img, shape=(h // block_size, w // block_size, block_size, block_size),
+                      strides=(block_size * s0, block_size * s1, s0, s1), writeable=img.flags.writeable)
 
-    for i in range(0, h, kernel_size):
-        for j in range(0, w, kernel_size):
+def _pad_to_blocks(img, block_size, dtype):
+    h, w = img.shape
+    padded = np.zeros((-(-h // block_size) * block_size, -(-w // block_size) * block_size), dtype=dtype)
+    padded[:h, :w] = img
+    return padded
 
-            block = img[i:i + kernel_size, j:j + kernel_size]
+def Block_DCT(img, block_size=8, dtype=np.float64):
+    """
+    Orthonormal 2D DCT of every block_size x block_size block in one batched call.
+    The image is zero-padded to whole blocks and the padded coefficients are returned,
+    so Block_IDCT reconstructs it exactly.
+    """
+    coeffs = _pad_to_blocks(img, block_size, dtype)
+    blocks = block_view(coeffs, block_size)
+    blocks[...] = dctn(blocks, axes=(2, 3), norm='ortho')
+    return coeffs
 
-            padded_block = np.zeros((kernel_size, kernel_size), dtype=np.float32)
-            padded_block[:block.shape[0], :block.shape[1]] = block
+def Block_IDCT(coeffs, block_size=8, shape=None):
+    """
+    Inverse of Block_DCT, cropped to `shape` (the original image shape) if given.
+    `coeffs` must be the padded Block_DCT output (sides multiples of block_size).
+    """
+    img = np.array(coeffs)
+    blocks = block_view(img, block_size)
+    blocks[...] = idctn(blocks, axes=(2, 3), norm='ortho')
+    if shape is not None:
+        img = img[:shape[0], :shape[1]]
+    return img
 
-            dct_block = dct(dct(padded_block, type=2, axis=0, norm='ortho'), type=2, axis=1, norm='ortho')
+def Block_Frequency_Filter(coeffs, block_size=8, keep=(2, 2)):
+    """
+    Keep the lowest keep[0] x keep[1] frequencies of every block and zero the rest.
+    """
+    filtered = np.zeros_like(coeffs)
+    block_view(filtered, block_size)[:, :, :keep[0], :keep[1]] = block_view(coeffs, block_size)[:, :, :keep[0], :keep[1]]
+    return filtered
 
-            dct_result[i:i + block.shape[0], j:j + block.shape[1]] = dct_block[:block.shape[0], :block.shape[1]]
+def Local_DCT(img, kernel_size = 8):
+    #TODO:
+        # 1. Use opencv’s DCT function or numpy’s fft2 function / Designed according to formula
+        # 2. Decide the core size by yourself (default 8 * 8)
+    # coefficients cropped to the image for display; Block_IDCT needs the padded Block_DCT output
+    h, w = img.shape
+    dct_result = Block_DCT(img, kernel_size, dtype=np.float32)
 
-    return dct_result
+    return dct_result[:h, :w]
 
-def frequency_Domain_filter(DCT_img, crop_size=(150, 150)):
+def frequency_Domain_filter(DCT_img, crop_size=(150, 150), direct_path=None):
     # TODO:
         # 1. Input the DCT transform frequency domain image
         # 2. Crop areas of concentrated energy in the image
         # 3. After outputting the result, do IDCT
-    IDCT_img = idct(idct(DCT_img, axis=1, norm='ortho'), axis=0, norm='ortho')
-    cv.imwrite('./result/reconstructed_image_direct.png', np.clip(IDCT_img , 0, 255).astype(np.uint8))
+    if direct_path is not None:
+        IDCT_img = idct(idct(DCT_img, axis=1, norm='ortho'), axis=0, norm='ortho')
+        cv.imwrite(direct_path, np.clip(IDCT_img , 0, 255).astype(np.uint8))
     cropped_DCT = np.zeros_like(DCT_img)
     cropped_DCT[:crop_size[0], :crop_size[1]] = DCT_img[:crop_size[0], :crop_size[1]]
 
@@ -66,49 +106,135 @@ def frequency_Domain_filter(DCT_img, crop_size=(150, 150)):
     return IDCT_img
 
 
+def _psnr_from_mse(mse, max_pixel):
+    with np.errstate(divide='ignore'):
+        return 10 * np.log10((max_pixel ** 2) / np.maximum(mse, 0))
+
+def rd_curve(DCT_img, max_pixel=255.0):
+    """
+    PSNR of every low-frequency crop of orthonormal DCT coefficients, without any
+    inverse transform: by Parseval the MSE of keeping DCT_img[:r, :c] is the energy
+    of the dropped coefficients divided by the pixel count.
+    Returns an (H+1, W+1) array whose entry [r, c] is the PSNR of crop_size=(r, c).
+    """
+    energy = np.square(DCT_img, dtype=np.float64)
+    kept = np.zeros((energy.shape[0] + 1, energy.shape[1] + 1))
+    np.cumsum(np.cumsum(energy, axis=0), axis=1, out=kept[1:, 1:])
+    return _psnr_from_mse((kept[-1, -1] - kept) / energy.size, max_pixel)
+
+def rd_curve_topk(DCT_img, max_pixel=255.0):
+    """
+    PSNR of keeping the k largest-energy coefficients, for k = 0 .. H*W.
+    """
+    energy = np.sort(np.square(DCT_img, dtype=np.float64), axis=None)[::-1]
+    kept = np.concatenate(([0.0], np.cumsum(energy)))
+    return _psnr_from_mse((kept[-1] - kept) / energy.size, max_pixel)
+
+def select_crop(DCT_img, target_psnr, max_pixel=255.0):
+    """
+    Smallest-area crop_size (r, c) whose predicted PSNR reaches target_psnr.
+    """
+    psnr = rd_curve(DCT_img, max_pixel)
+    area = np.multiply.outer(np.arange(psnr.shape[0]), np.arange(psnr.shape[1]))
+    area = np.where(psnr >= target_psnr, area, np.iinfo(area.dtype).max)
+    r, c = np.unravel_index(np.argmin(area), area.shape)
+    return int(r), int(c)
+
+def topk_filter(DCT_img, k):
+    """
+    Keep the k largest-magnitude coefficients and zero the rest.
+    """
+    filtered = np.zeros_like(DCT_img)
+    if k > 0:
+        flat = np.abs(DCT_img).ravel()
+        keep = np.argpartition(flat, flat.size - k)[flat.size - k:]
+        filtered.flat[keep] = DCT_img.flat[keep]
+    return filtered
+
+# Butterfly twiddles, computed once: c[k] = cos(k*pi/16)
+_c = np.cos(np.arange(8) * np.pi / 16)
+_DC = np.sqrt(1 / 8)
+_HALF = 0.5
+# Odd-part rotation factors of the Loeffler-Ligtenberg-Moschytz butterfly (as in libjpeg's
+# jfdctint / jidctint), with the orthonormal 1/2 instead of libjpeg's sqrt(2) folded in
+_Z5 = _HALF * _c[3]
+_A0 = _HALF * (_c[1] + _c[3] - _c[5] - _c[7])
+_A1 = _HALF * (_c[1] + _c[3] + _c[5] - _c[7])
+_A2 = _HALF * (_c[1] + _c[3] - _c[5] + _c[7])
+_A3 = _HALF * (-_c[1] + _c[3] + _c[5] - _c[7])
+_Z1 = _HALF * (_c[7] - _c[3])
+_Z2 = _HALF * (-_c[1] - _c[3])
+_Z3 = _HALF * (-_c[3] - _c[5])
+_Z4 = _HALF * (_c[5] - _c[3])
+
+def _odd_butterfly(a0, a1, a2, a3):
+    """
+    Odd part of the 8-point DCT in butterfly form (12 multiplies instead of 16):
+    (X1, X3, X5, X7) from the stage-1 differences (d0, d1, d2, d3). The 4x4 map is
+    symmetric, so the same stages give (d0, d1, d2, d3) from (X1, X3, X5, X7) in the IDCT.
+    """
+    z1 = (a0 + a3) * _Z1
+    z2 = (a1 + a2) * _Z2
+    z3 = a1 + a3
+    z4 = a0 + a2
+    z5 = (z3 + z4) * _Z5
+    z3 = z3 * _Z3 + z5
+    z4 = z4 * _Z4 + z5
+    return (a0 * _A0 + z1 + z4,
+            a1 * _A1 + z2 + z3,
+            a2 * _A2 + z2 + z4,
+            a3 * _A3 + z1 + z3)
+
 def butterfly_dct_8(input_vector):
+    """
+    Orthonormal 8-point DCT-II along the last axis of an (..., 8) array, every butterfly
+    stage (even and odd part) applied to all vectors at once. Matches scipy's
+    dct(x, norm='ortho') to rounding error.
+    """
+    x = np.asarray(input_vector, dtype=np.float64)
+    assert x.shape[-1] == 8, "Input vectors must have a length of 8"
 
-    assert len(input_vector) == 8, "Input vector must have a length of 8"
-    
     # Stage 1: 加法與減法
-    stage1 = np.zeros(8)
-    stage1[0] = input_vector[0] + input_vector[7]
-    stage1[1] = input_vector[1] + input_vector[6]
-    stage1[2] = input_vector[2] + input_vector[5]
-    stage1[3] = input_vector[3] + input_vector[4]
-    stage1[4] = input_vector[3] - input_vector[4]
-    stage1[5] = input_vector[2] - input_vector[5]
-    stage1[6] = input_vector[1] - input_vector[6]
-    stage1[7] = input_vector[0] - input_vector[7]
-    
-    # Stage 2: 係數運算 (cos/sin)
-    c1 = np.cos(np.pi / 16)
-    c3 = np.cos(3 * np.pi / 16)
-    s1 = np.sin(np.pi / 16)
-    s3 = np.sin(3 * np.pi / 16)
-
-    stage2 = np.zeros(8)
-    stage2[0] = stage1[0] + stage1[3]
-    stage2[1] = stage1[1] + stage1[2]
-    stage2[2] = c3 * stage1[4] + s3 * stage1[5]
-    stage2[3] = c1 * stage1[6] + s1 * stage1[7]
-    stage2[4] = stage1[0] - stage1[3]
-    stage2[5] = stage1[1] - stage1[2]
-    stage2[6] = -s3 * stage1[4] + c3 * stage1[5]
-    stage2[7] = -s1 * stage1[6] + c1 * stage1[7]
-
-    # Stage 3: \sqrt{2} 處理
-    stage3 = np.zeros(8)
-    stage3[0] = stage2[0]
-    stage3[1] = stage2[1]
-    stage3[2] = np.sqrt(2) * stage2[2]
-    stage3[3] = np.sqrt(2) * stage2[3]
-    stage3[4] = stage2[4]
-    stage3[5] = stage2[5]
-    stage3[6] = np.sqrt(2) * stage2[6]
-    stage3[7] = np.sqrt(2) * stage2[7]
-
-    return stage3
+    s = x[..., :4] + x[..., 7:3:-1]
+    d = x[..., :4] - x[..., 7:3:-1]
+
+    # Stage 2: even part butterflies
+    e0 = s[..., 0] + s[..., 3]
+    e1 = s[..., 1] + s[..., 2]
+    e2 = s[..., 0] - s[..., 3]
+    e3 = s[..., 1] - s[..., 2]
+
+    # Stage 3: 係數運算 (cos/sin)
+    output = np.empty_like(x)
+    output[..., 0] = _DC * (e0 + e1)
+    output[..., 4] = _DC * (e0 - e1)
+    output[..., 2] = _HALF * (_c[2] * e2 + _c[6] * e3)
+    output[..., 6] = _HALF * (_c[6] * e2 - _c[2] * e3)
+    output[..., 1], output[..., 3], output[..., 5], output[..., 7] = _odd_butterfly(
+        d[..., 0], d[..., 1], d[..., 2], d[..., 3])
+
+    return output
+
+def butterfly_idct_8(input_vector):
+    """
+    Inverse of butterfly_dct_8 (orthonormal DCT-III), the butterfly stages run backwards.
+    """
+    X = np.asarray(input_vector, dtype=np.float64)
+    assert X.shape[-1] == 8, "Input vectors must have a length of 8"
+
+    e0 = _DC * (X[..., 0] + X[..., 4])
+    e1 = _DC * (X[..., 0] - X[..., 4])
+    e2 = _HALF * (_c[2] * X[..., 2] + _c[6] * X[..., 6])
+    e3 = _HALF * (_c[6] * X[..., 2] - _c[2] * X[..., 6])
+
+    s = np.stack([e0 + e2, e1 + e3, e1 - e3, e0 - e2], axis=-1)
+    d = np.stack(_odd_butterfly(X[..., 1], X[..., 3], X[..., 5], X[..., 7]), axis=-1)
+
+    output = np.empty_like(X)
+    output[..., :4] = s + d
+    output[..., 7:3:-1] = s - d
+
+    return output
 
 def dct_2d_butterfly(img):
     """
@@ -119,26 +245,29 @@ def dct_2d_butterfly(img):
     h, w = img.shape
 
     # 零填充到 8 的倍數
-    padded_h = (h + 7) // 8 * 8
-    padded_w = (w + 7) // 8 * 8
-    padded_img = np.zeros((padded_h, padded_w), dtype=np.float32)
-    padded_img[:h, :w] = img
-
-    # 計算 2D DCT
-    dct_result = np.zeros_like(padded_img, dtype=np.float32)
-
-    # 對每一行進行 1D DCT
-    for i in range(padded_h):
-        for j in range(0, padded_w, 8):
-            dct_result[i, j:j + 8] = butterfly_dct_8(padded_img[i, j:j + 8])
-
-    # 對每一列進行 1D DCT
-    final_result = np.zeros_like(padded_img, dtype=np.float32)
-    for j in range(padded_w):
-        for i in range(0, padded_h, 8):
-            final_result[i:i + 8, j] = butterfly_dct_8(dct_result[i:i + 8, j])
-
-    return final_result[:h, :w]  # 截取回原圖大小
+    padded_img = _pad_to_blocks(img, 8, np.float64)
+    blocks = block_view(padded_img, 8)
+
+    # 對每一行進行 1D DCT, 再對每一列進行 1D DCT
+    rows_done = butterfly_dct_8(blocks)
+    final_result = butterfly_dct_8(rows_done.swapaxes(2, 3)).swapaxes(2, 3)
+
+    result = np.empty_like(padded_img, dtype=np.float32)
+    block_view(result, 8)[...] = final_result
+    return result[:h, :w]  # 截取回原圖大小
+
+def idct_2d_butterfly(dct_img, shape=None):
+    """
+    Inverse of the block-wise butterfly DCT on 8 x 8 blocks (sides must be multiples of 8).
+    """
+    blocks = block_view(np.ascontiguousarray(dct_img, dtype=np.float64), 8)
+    cols_done = butterfly_idct_8(blocks.swapaxes(2, 3)).swapaxes(2, 3)
+
+    result = np.empty(dct_img.shape, dtype=np.float64)
+    block_view(result, 8)[...] = butterfly_idct_8(cols_done)
+    if shape is not None:
+        result = result[:shape[0], :shape[1]]
+    return result
  
 if __name__ == '__main__':
 
@@ -147,7 +276,9 @@ if __name__ == '__main__':
     psnr1=calculate_psnr(img,dct_result)
     print(f"psnr:{psnr1}")
     save_dct_as_image(dct_result,"./result/dct_result.png")
-    reconstructed_img = frequency_Domain_filter(dct_result, crop_size=(int(img.shape[0]/5), int(img.shape[1]/5)))
+    crop_size = (int(img.shape[0]/5), int(img.shape[1]/5))
+    print(f"predicted psnr:{rd_curve(dct_result)[crop_size]}")
+    reconstructed_img = frequency_Domain_filter(dct_result, crop_size=crop_size, direct_path='./result/reconstructed_image_direct.png')
     psnr1=calculate_psnr(img,reconstructed_img)
     print(f"psnr:{psnr1}")
 
@@ -157,14 +288,16 @@ if __name__ == '__main__':
 
     local_dct_result = Local_DCT(img, kernel_size=8)
     save_dct_as_image(local_dct_result,"./result/local_dct_result.png")
-    reconstructed_img = frequency_Domain_filter(local_dct_result, crop_size=(int(img.shape[0]/5), int(img.shape[1]/5)))
+    block_dct_result = Block_DCT(img, block_size=8)
+    reconstructed_img = Block_IDCT(Block_Frequency_Filter(block_dct_result, 8, keep=(2, 2)), 8, img.shape)
     cv.imwrite("./result/local_reconstructed_image.png", np.clip(reconstructed_img, 0, 255).astype(np.uint8))
     psnr1=calculate_psnr(img,reconstructed_img)
     print(f"psnr:{psnr1}")
 
     local_dct_result =dct_2d_butterfly(img)
     save_dct_as_image(local_dct_result,"./result/local_dct_result_butterfly.png")
-    reconstructed_img = frequency_Domain_filter(local_dct_result, crop_size=(int(img.shape[0]/5), int(img.shape[1]/5)))
+    butterfly_result = Block_Frequency_Filter(_pad_to_blocks(local_dct_result, 8, np.float64), 8, keep=(2, 2))
+    reconstructed_img = idct_2d_butterfly(butterfly_result, img.shape)
     cv.imwrite("./result/butterfly_reconstructed_image.png", np.clip(reconstructed_img, 0, 255).astype(np.uint8))
     psnr1=calculate_psnr(img,reconstructed_img)
     print(f"psnr:{psnr1}")
\ No newline at end of file
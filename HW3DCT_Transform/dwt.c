@@ -1,5 +1,9 @@
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#include "dwt.h"
+
+// Build: gcc -O2 -fPIC -shared dwt.c -o libdwt.so -lm
 
 void dwt_2d(int N, double *input, double *output_ll, double *output_lh, double *output_hl, double *output_hh) {
     int halfN = N / 2;
@@ -72,4 +76,21 @@ void idwt_2d(int N, double *input_ll, double *input_lh, double *input_hl, double
     // Free temporary arrays
     free(temp_low);
     free(temp_high);
-}
\ No newline at end of file
+}
+
+
+// Multi-level transforms (see dwt.h): the kernel is compiled once for double and once for float
+#define HAAR_SQRT2 1.4142135623730951
+#define HAAR_INV_SQRT2 0.7071067811865476
+
+#define DWT_REAL double
+#define DWT_NAME(name) name
+#include "dwt_kernel.h"
+#undef DWT_REAL
+#undef DWT_NAME
+
+#define DWT_REAL float
+#define DWT_NAME(name) name##_f
+#include "dwt_kernel.h"
+#undef DWT_REAL
+#undef DWT_NAME
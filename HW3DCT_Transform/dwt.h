@@ -30,4 +30,50 @@ void dwt_2d(int N, double *input, double *output_ll, double *output_lh, double *
  */
 void idwt_2d(int N, double *input_ll, double *input_lh, double *input_hl, double *input_hh, double *reconstructed);
 
+#define DWT_MAX_LEVELS 32
+
+/**
+ * Perform an L-level 2D Haar DWT of an H x W image (any H, W) in one call.
+ *
+ * The result is a packed pyramid of the same H x W shape. Each level splits the
+ * current LL region (starting with the whole image) into ceil/floor halves:
+ * LL top-left, horizontal high-pass (HL) top-right, vertical high-pass (LH)
+ * bottom-left and HH bottom-right; the next level works on the new LL.
+ * Levels stop early once the LL region is 1 x 1.
+ *
+ * @param height Number of rows H.
+ * @param width Number of columns W.
+ * @param levels Number of levels L.
+ * @param input Pointer to the input image (H x W, row-major). May equal pyramid.
+ * @param pyramid Pointer to the output pyramid (H x W, row-major).
+ * @param workspace Pointer to scratch space of H x W elements.
+ * @return The number of levels performed.
+ */
+int dwt_2d_levels(int height, int width, int levels, const double *input, double *pyramid, double *workspace);
+
+/**
+ * Inverse of dwt_2d_levels: rebuild the H x W image from an L-level pyramid.
+ *
+ * @param pyramid Pointer to the pyramid (H x W, row-major). May equal output.
+ * @param output Pointer to the reconstructed image (H x W, row-major).
+ * @param workspace Pointer to scratch space of H x W elements.
+ * @return The number of levels inverted.
+ */
+int idwt_2d_levels(int height, int width, int levels, const double *pyramid, double *output, double *workspace);
+
+/**
+ * float32 versions of dwt_2d_levels and idwt_2d_levels.
+ */
+int dwt_2d_levels_f(int height, int width, int levels, const float *input, float *pyramid, float *workspace);
+int idwt_2d_levels_f(int height, int width, int levels, const float *pyramid, float *output, float *workspace);
+
+/**
+ * dwt_2d_levels / idwt_2d_levels over a contiguous stack of `count` H x W frames
+ * in one call; all frames share the same H x W workspace.
+ */
+int dwt_2d_levels_batch(int count, int height, int width, int levels, const double *input, double *pyramid, double *workspace);
+int idwt_2d_levels_batch(int count, int height, int width, int levels, const double *pyramid, double *output, double *workspace);
+int dwt_2d_levels_batch_f(int count, int height, int width, int levels, const float *input, float *pyramid, float *workspace);
+int idwt_2d_levels_batch_f(int count, int height, int width, int levels, const float *pyramid, float *output, float *workspace);
+
 #endif // DWT_H
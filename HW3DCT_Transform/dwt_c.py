@@ -1,39 +1,137 @@
-import cv2
 import numpy as np
 import ctypes
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend to avoid QT plugin issues
-import matplotlib.pyplot as plt
-
-# Load the shared library
-dwt = ctypes.CDLL('./libdwt.so')
-
-# Define the updated C function interface for dwt_2d
-dwt.dwt_2d.argtypes = [
-    ctypes.c_int,  # Matrix size N
-    ctypes.POINTER(ctypes.c_double),  # Input matrix pointer
-    ctypes.POINTER(ctypes.c_double),  # LL output pointer
-    ctypes.POINTER(ctypes.c_double),  # LH output pointer
-    ctypes.POINTER(ctypes.c_double),  # HL output pointer
-    ctypes.POINTER(ctypes.c_double)   # HH output pointer
-]
-dwt.dwt_2d.restype = None
-
-# Define the updated C function interface for idwt_2d
-dwt.idwt_2d.argtypes = [
-    ctypes.c_int,  # Matrix size N
-    ctypes.POINTER(ctypes.c_double),  # LL input pointer
-    ctypes.POINTER(ctypes.c_double),  # LH input pointer
-    ctypes.POINTER(ctypes.c_double),  # HL input pointer
-    ctypes.POINTER(ctypes.c_double),  # HH input pointer
-    ctypes.POINTER(ctypes.c_double)   # Reconstructed output pointer
-]
-dwt.idwt_2d.restype = None
 
-def perform_dwt(image):
+import backends
+
+# The native kernels live in libdwt.so (gcc -O2 -fPIC -shared dwt.c -o libdwt.so -lm), loaded
+# on first use from this directory; every operation also has a NumPy version (see backends.py)
+
+def _configure(dwt):
+    # Define the updated C function interface for dwt_2d
+    dwt.dwt_2d.argtypes = [
+        ctypes.c_int,  # Matrix size N
+        ctypes.POINTER(ctypes.c_double),  # Input matrix pointer
+        ctypes.POINTER(ctypes.c_double),  # LL output pointer
+        ctypes.POINTER(ctypes.c_double),  # LH output pointer
+        ctypes.POINTER(ctypes.c_double),  # HL output pointer
+        ctypes.POINTER(ctypes.c_double)   # HH output pointer
+    ]
+    dwt.dwt_2d.restype = None
+
+    # Define the updated C function interface for idwt_2d
+    dwt.idwt_2d.argtypes = [
+        ctypes.c_int,  # Matrix size N
+        ctypes.POINTER(ctypes.c_double),  # LL input pointer
+        ctypes.POINTER(ctypes.c_double),  # LH input pointer
+        ctypes.POINTER(ctypes.c_double),  # HL input pointer
+        ctypes.POINTER(ctypes.c_double),  # HH input pointer
+        ctypes.POINTER(ctypes.c_double)   # Reconstructed output pointer
+    ]
+    dwt.idwt_2d.restype = None
+
+    # Multi-level transforms over contiguous N x H x W stacks, one function per element type
+    for dtype, suffix in ((np.float64, ''), (np.float32, '_f')):
+        for name in ('dwt_2d_levels_batch', 'idwt_2d_levels_batch'):
+            function = getattr(dwt, name + suffix)
+            function.argtypes = [
+                ctypes.c_int,  # Number of frames N
+                ctypes.c_int,  # Height H
+                ctypes.c_int,  # Width W
+                ctypes.c_int,  # Number of levels
+                np.ctypeslib.ndpointer(dtype=dtype, flags="C_CONTIGUOUS"),  # Input stack
+                np.ctypeslib.ndpointer(dtype=dtype, flags="C_CONTIGUOUS"),  # Output stack
+                np.ctypeslib.ndpointer(dtype=dtype, flags="C_CONTIGUOUS")   # Workspace (H x W)
+            ]
+            function.restype = ctypes.c_int
+
+backends.on_load('dwt', _configure)
+
+# ---------------------------------------------------------------------------
+# NumPy versions of the kernels in dwt_kernel.h (same lifting steps and layout)
+# ---------------------------------------------------------------------------
+
+def _haar_split(x):
+    """
+    One lifting Haar step along the last axis: ceil(n / 2) low then floor(n / 2) high.
+    """
+    sqrt2, inv_sqrt2 = x.dtype.type(np.sqrt(2)), x.dtype.type(1 / np.sqrt(2))
+    n = x.shape[-1]
+    half = n // 2
+    d = x[..., 0:2 * half:2] - x[..., 1:2 * half:2]
+    s = x[..., 1:2 * half:2] + x.dtype.type(0.5) * d
+    out = np.empty_like(x)
+    out[..., :half] = sqrt2 * s
+    out[..., n - half:] = inv_sqrt2 * d
+    if n & 1:
+        out[..., half] = sqrt2 * x[..., -1]
+    return out
+
+def _haar_merge(x):
     """
-    Perform 1-level DWT using the updated C shared library.
+    Inverse of _haar_split along the last axis.
     """
+    sqrt2, inv_sqrt2 = x.dtype.type(np.sqrt(2)), x.dtype.type(1 / np.sqrt(2))
+    n = x.shape[-1]
+    half = n // 2
+    s = inv_sqrt2 * x[..., :half]
+    d = sqrt2 * x[..., n - half:]
+    out = np.empty_like(x)
+    out[..., 1:2 * half:2] = s - x.dtype.type(0.5) * d
+    out[..., 0:2 * half:2] = d + out[..., 1:2 * half:2]
+    if n & 1:
+        out[..., -1] = inv_sqrt2 * x[..., half]
+    return out
+
+def _level_sizes(height, width, levels):
+    sizes = [(height, width)]
+    while len(sizes) <= levels and (sizes[-1][0] > 1 or sizes[-1][1] > 1):
+        h, w = sizes[-1]
+        sizes.append(((h + 1) // 2, (w + 1) // 2))
+    return sizes
+
+def _numpy_dwt_levels(frames, levels, out, workspace):
+    out[...] = frames
+    sizes = _level_sizes(frames.shape[1], frames.shape[2], levels)
+    for h, w in sizes[:-1]:
+        region = out[:, :h, :w]
+        region[...] = _haar_split(_haar_split(region).swapaxes(1, 2)).swapaxes(1, 2)
+    return len(sizes) - 1
+
+def _numpy_idwt_levels(pyramids, levels, out, workspace):
+    out[...] = pyramids
+    sizes = _level_sizes(pyramids.shape[1], pyramids.shape[2], levels)
+    for h, w in reversed(sizes[:-1]):
+        region = out[:, :h, :w]
+        region[...] = _haar_merge(_haar_merge(region.swapaxes(1, 2)).swapaxes(1, 2))
+    return len(sizes) - 1
+
+def _native_dwt_levels(frames, levels, out, workspace):
+    dwt = backends.require('dwt')
+    function = dwt.dwt_2d_levels_batch_f if frames.dtype == np.float32 else dwt.dwt_2d_levels_batch
+    return function(frames.shape[0], frames.shape[1], frames.shape[2], levels, frames, out, workspace)
+
+def _native_idwt_levels(pyramids, levels, out, workspace):
+    dwt = backends.require('dwt')
+    function = dwt.idwt_2d_levels_batch_f if pyramids.dtype == np.float32 else dwt.idwt_2d_levels_batch
+    return function(pyramids.shape[0], pyramids.shape[1], pyramids.shape[2], levels, pyramids, out, workspace)
+
+def _numpy_dwt(image):
+    size = image.shape[0] // 2
+    even = np.ascontiguousarray(image[:2 * size, :2 * size])
+    pyramid = np.empty((1, 2 * size, 2 * size))
+    _numpy_dwt_levels(even[np.newaxis], 1, pyramid, None)
+    LL, ((LH, HL, HH),) = pyramid_bands(pyramid[0], 1)
+    return LL.copy(), LH.copy(), HL.copy(), HH.copy()
+
+def _numpy_idwt(LL, LH, HL, HH):
+    size = LL.shape[0]
+    pyramid = np.block([[LL, HL], [LH, HH]])[np.newaxis]
+    reconstructed = np.empty((1, 2 * size, 2 * size))
+    _numpy_idwt_levels(pyramid, 1, reconstructed, None)
+    return reconstructed[0]
+
+def _native_dwt(image):
+    dwt = backends.require('dwt')
     N = image.shape[0]
     size = N // 2
 
@@ -54,10 +152,8 @@ def perform_dwt(image):
     )
     return LL, LH, HL, HH
 
-def perform_idwt(LL, LH, HL, HH):
-    """
-    Perform inverse DWT using the updated C shared library.
-    """
+def _native_idwt(LL, LH, HL, HH):
+    dwt = backends.require('dwt')
     size = LL.shape[0] * 2  # Reconstructed size
     reconstructed = np.zeros((size, size), dtype=np.float64)
 
@@ -72,15 +168,146 @@ def perform_idwt(LL, LH, HL, HH):
     )
     return reconstructed
 
-def perform_2level_dwt(image):
+# the NumPy and native float64 results differ by a few ulps, so these are not timed
+# against each other: the native kernels are used whenever libdwt.so loads
+backends.register('dwt_2d', _numpy_dwt, _native_dwt, 'dwt')
+backends.register('idwt_2d', _numpy_idwt, _native_idwt, 'dwt')
+backends.register('dwt_2d_levels', _numpy_dwt_levels, _native_dwt_levels, 'dwt')
+backends.register('idwt_2d_levels', _numpy_idwt_levels, _native_idwt_levels, 'dwt')
+
+def _square_image(image, name):
+    image = np.ascontiguousarray(image, dtype=np.float64)
+    if image.ndim != 2 or image.shape[0] != image.shape[1]:
+        raise ValueError(f"{name} expects a square N x N array, got shape {image.shape}")
+    return image
+
+def perform_dwt(image):
+    """
+    Perform 1-level DWT (native library, or its NumPy version if that is unavailable).
+    The image is converted to a contiguous float64 array first if needed.
     """
-    Perform 2-level DWT by applying DWT twice on the LL coefficients.
+    return backends.get('dwt_2d')(_square_image(image, 'perform_dwt'))
+
+def perform_idwt(LL, LH, HL, HH):
+    """
+    Perform inverse DWT (native library, or its NumPy version if that is unavailable).
+    The bands are converted to contiguous float64 arrays first if needed.
+    """
+    LL, LH, HL, HH = (_square_image(band, 'perform_idwt') for band in (LL, LH, HL, HH))
+    if not LL.shape == LH.shape == HL.shape == HH.shape:
+        raise ValueError("perform_idwt expects four bands of the same shape")
+    return backends.get('idwt_2d')(LL, LH, HL, HH)
+
+def _levels_dtype(array):
+    dtype = array.dtype if array.dtype == np.float32 else np.dtype(np.float64)
+    return np.ascontiguousarray(array, dtype=dtype)
+
+def perform_multilevel_dwt(image, levels):
+    """
+    L-level DWT of an H x W image (float32 stays float32, anything else becomes float64)
+    in one call. Returns the packed pyramid, see pyramid_bands.
     """
-    # First-level DWT
-    LL1, LH1, HL1, HH1 = perform_dwt(image)
+    image = _levels_dtype(image)
+    pyramid = np.empty_like(image)
+    workspace = np.empty_like(image)
+    backends.get('dwt_2d_levels')(image[np.newaxis], levels, pyramid[np.newaxis], workspace)
+    return pyramid
 
-    # Second-level DWT on LL1
-    LL2, LH2, HL2, HH2 = perform_dwt(LL1)
+def perform_multilevel_idwt(pyramid, levels):
+    """
+    Rebuild the image from an L-level pyramid in one call.
+    """
+    pyramid = _levels_dtype(pyramid)
+    image = np.empty_like(pyramid)
+    workspace = np.empty_like(pyramid)
+    backends.get('idwt_2d_levels')(pyramid[np.newaxis], levels, image[np.newaxis], workspace)
+    return image
+
+def pyramid_bands(pyramid, levels):
+    """
+    Views of the bands of a packed pyramid: (LL, [(LH, HL, HH) of level 1, level 2, ...]).
+    At each level the LL region splits into ceil/floor halves with LL top-left,
+    HL (horizontal high-pass) top-right, LH (vertical high-pass) bottom-left and HH
+    bottom-right, so LH and HL swap places compared to reconstruct_visualization.
+    """
+    h, w = pyramid.shape
+    details = []
+    for _ in range(levels):
+        if h <= 1 and w <= 1:
+            break
+        hl, wl = (h + 1) // 2, (w + 1) // 2
+        details.append((pyramid[hl:h, :wl], pyramid[:hl, wl:w], pyramid[hl:h, wl:w]))
+        h, w = hl, wl
+    return pyramid[:h, :w], details
+
+class DWTPlan:
+    """
+    Reusable L-level DWT of same-sized H x W frames (float64 or float32).
+    Shape and dtype are checked once here, and the pyramid, image and workspace
+    buffers are allocated once for up to `max_frames` frames, so forward() and
+    inverse() allocate nothing. They take one H x W frame or an N x H x W stack in
+    a single call and return views of the plan's buffers, which the next
+    call overwrites; copy them to keep them.
+    """
+
+    def __init__(self, shape, levels, dtype=np.float64, max_frames=1):
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float64, np.float32):
+            raise TypeError(f"DWTPlan supports float64 and float32, not {self.dtype}")
+        if len(shape) != 2 or min(shape) < 1:
+            raise ValueError(f"DWTPlan expects an H x W frame shape, got {shape}")
+        if max_frames < 1:
+            raise ValueError("max_frames must be at least 1")
+
+        self.shape = tuple(int(n) for n in shape)
+        self.max_frames = max_frames
+        self.pyramid = np.zeros((max_frames,) + self.shape, dtype=self.dtype)
+        self.image = np.zeros((max_frames,) + self.shape, dtype=self.dtype)
+        self.workspace = np.empty(self.shape, dtype=self.dtype)
+        self.levels = len(pyramid_bands(self.workspace, levels)[1])  # levels stop at a 1 x 1 LL
+
+    def _stack(self, frames):
+        if frames.dtype != self.dtype:
+            raise ValueError(f"expected {self.dtype} frames, got {frames.dtype}")
+        if not frames.flags.c_contiguous:
+            raise ValueError("frames must be C-contiguous")
+        if frames.shape == self.shape:
+            return frames[np.newaxis], True
+        if frames.ndim != 3 or frames.shape[1:] != self.shape:
+            raise ValueError(f"expected {self.shape} frames, got shape {frames.shape}")
+        if len(frames) > self.max_frames:
+            raise ValueError(f"{len(frames)} frames exceed the plan's max_frames={self.max_frames}")
+        return frames, False
+
+    def _run(self, operation, frames, out):
+        frames, single = self._stack(frames)
+        out = out[:len(frames)]
+        backends.get(operation)(frames, self.levels, out, self.workspace)
+        return out[0] if single else out
+
+    def forward(self, frames):
+        """
+        Packed pyramid(s) of one frame or a stack of frames.
+        """
+        return self._run('dwt_2d_levels', frames, self.pyramid)
+
+    def inverse(self, pyramids):
+        """
+        Frame(s) rebuilt from one pyramid or a stack of pyramids.
+        """
+        return self._run('idwt_2d_levels', pyramids, self.image)
+
+    def bands(self, index=0):
+        """
+        Band views of the index-th pyramid of the last forward(), as pyramid_bands returns them.
+        """
+        return pyramid_bands(self.pyramid[index], self.levels)
+
+def perform_2level_dwt(image):
+    """
+    Perform 2-level DWT in one call and split the pyramid into its bands.
+    """
+    LL2, ((LH1, HL1, HH1), (LH2, HL2, HH2)) = pyramid_bands(perform_multilevel_dwt(image, 2), 2)
 
     return LL2, LH2, HL2, HH2, LH1, HL1, HH1
 
@@ -101,6 +328,11 @@ def reconstruct_visualization(LL2, LH2, HL2, HH2, LH1, HL1, HH1):
     return combined
 
 def main():
+    import cv2
+    import matplotlib
+    matplotlib.use('Agg')  # Use non-interactive backend to avoid QT plugin issues
+    import matplotlib.pyplot as plt
+
     # Load and preprocess the image
     image = cv2.imread('./images/F-16-image.png', cv2.IMREAD_GRAYSCALE)
     if image is None:
@@ -111,7 +343,8 @@ def main():
     resized_image = image.astype(np.float64) / 255.0
 
     # Perform 2-level DWT
-    LL2, LH2, HL2, HH2, LH1, HL1, HH1 = perform_2level_dwt(resized_image)
+    pyramid = perform_multilevel_dwt(resized_image, 2)
+    LL2, ((LH1, HL1, HH1), (LH2, HL2, HH2)) = pyramid_bands(pyramid, 2)
 
     # Reconstruct visualization
     visualization = reconstruct_visualization(LL2, LH2, HL2, HH2, LH1, HL1, HH1)
@@ -127,8 +360,8 @@ def main():
     plt.axis('off')
     plt.savefig('dwt_visualization.png', dpi=300)
 
-    # Perform IDWT to reconstruct the original image
-    reconstructed_image = perform_idwt(LL2, LH2, HL2, HH2)
+    # Perform the 2-level IDWT to reconstruct the original image
+    reconstructed_image = perform_multilevel_idwt(pyramid, 2)
 
     # Normalize the reconstructed image for display
     reconstructed_normalized = cv2.normalize(reconstructed_image, None, 0, 255, cv2.NORM_MINMAX)
@@ -0,0 +1,150 @@
+// Multi-level Haar DWT kernels in lifting form, included by dwt.c once per
+// element type with DWT_REAL (the element type) and DWT_NAME(name) (the
+// exported name for that type) defined.
+//
+// A level splits each dimension of the current LL region into ceil(n / 2)
+// low and floor(n / 2) high coefficients: a pair (a, b) gives
+// d = a - b, s = b + d / 2, low = sqrt(2) * s, high = d / sqrt(2)
+// (the same values as (a + b) / sqrt(2) and (a - b) / sqrt(2)); an unpaired
+// last sample gives low = sqrt(2) * a.
+// Rows go from the pyramid to the workspace and columns come back, so no pass
+// needs a copy and both read and write whole rows.
+
+// Row pass: in[0 .. w) -> out[0 .. ceil(w / 2)) low, out[ceil(w / 2) .. w) high
+static void DWT_NAME(haar_row)(const DWT_REAL *in, DWT_REAL *out, int w) {
+    int half = w / 2;
+    int wl = w - half;
+
+    for (int j = 0; j < half; j++) {
+        DWT_REAL d = in[2 * j] - in[2 * j + 1];
+        DWT_REAL s = in[2 * j + 1] + (DWT_REAL)0.5 * d;
+        out[j] = (DWT_REAL)HAAR_SQRT2 * s;
+        out[wl + j] = (DWT_REAL)HAAR_INV_SQRT2 * d;
+    }
+    if (w & 1) out[half] = (DWT_REAL)HAAR_SQRT2 * in[w - 1];
+}
+
+static void DWT_NAME(haar_row_inverse)(const DWT_REAL *in, DWT_REAL *out, int w) {
+    int half = w / 2;
+    int wl = w - half;
+
+    for (int j = 0; j < half; j++) {
+        DWT_REAL s = (DWT_REAL)HAAR_INV_SQRT2 * in[j];
+        DWT_REAL d = (DWT_REAL)HAAR_SQRT2 * in[wl + j];
+        DWT_REAL b = s - (DWT_REAL)0.5 * d;
+        out[2 * j] = d + b;
+        out[2 * j + 1] = b;
+    }
+    if (w & 1) out[w - 1] = (DWT_REAL)HAAR_INV_SQRT2 * in[half];
+}
+
+// Column pass over an h x w region with row stride `stride`, one pair of rows at a time
+static void DWT_NAME(haar_columns)(const DWT_REAL *in, DWT_REAL *out, int h, int w, int stride) {
+    int half = h / 2;
+    int hl = h - half;
+
+    for (int i = 0; i < half; i++) {
+        const DWT_REAL *a = in + (size_t)(2 * i) * stride;
+        const DWT_REAL *b = a + stride;
+        DWT_REAL *low = out + (size_t)i * stride;
+        DWT_REAL *high = out + (size_t)(hl + i) * stride;
+        for (int j = 0; j < w; j++) {
+            DWT_REAL d = a[j] - b[j];
+            DWT_REAL s = b[j] + (DWT_REAL)0.5 * d;
+            low[j] = (DWT_REAL)HAAR_SQRT2 * s;
+            high[j] = (DWT_REAL)HAAR_INV_SQRT2 * d;
+        }
+    }
+    if (h & 1) {
+        const DWT_REAL *a = in + (size_t)(h - 1) * stride;
+        DWT_REAL *low = out + (size_t)half * stride;
+        for (int j = 0; j < w; j++) low[j] = (DWT_REAL)HAAR_SQRT2 * a[j];
+    }
+}
+
+static void DWT_NAME(haar_columns_inverse)(const DWT_REAL *in, DWT_REAL *out, int h, int w, int stride) {
+    int half = h / 2;
+    int hl = h - half;
+
+    for (int i = 0; i < half; i++) {
+        const DWT_REAL *low = in + (size_t)i * stride;
+        const DWT_REAL *high = in + (size_t)(hl + i) * stride;
+        DWT_REAL *a = out + (size_t)(2 * i) * stride;
+        DWT_REAL *b = a + stride;
+        for (int j = 0; j < w; j++) {
+            DWT_REAL s = (DWT_REAL)HAAR_INV_SQRT2 * low[j];
+            DWT_REAL d = (DWT_REAL)HAAR_SQRT2 * high[j];
+            b[j] = s - (DWT_REAL)0.5 * d;
+            a[j] = d + b[j];
+        }
+    }
+    if (h & 1) {
+        const DWT_REAL *low = in + (size_t)half * stride;
+        DWT_REAL *a = out + (size_t)(h - 1) * stride;
+        for (int j = 0; j < w; j++) a[j] = (DWT_REAL)HAAR_INV_SQRT2 * low[j];
+    }
+}
+
+int DWT_NAME(dwt_2d_levels)(int height, int width, int levels, const DWT_REAL *input, DWT_REAL *pyramid, DWT_REAL *workspace) {
+    int h = height;
+    int w = width;
+    int done = 0;
+
+    if (input != pyramid) memcpy(pyramid, input, sizeof(DWT_REAL) * height * width);
+    while (done < levels && (h > 1 || w > 1)) {
+        for (int i = 0; i < h; i++) {
+            DWT_NAME(haar_row)(pyramid + (size_t)i * width, workspace + (size_t)i * width, w);
+        }
+        DWT_NAME(haar_columns)(workspace, pyramid, h, w, width);
+        h = (h + 1) / 2;
+        w = (w + 1) / 2;
+        done++;
+    }
+    return done;
+}
+
+int DWT_NAME(idwt_2d_levels)(int height, int width, int levels, const DWT_REAL *pyramid, DWT_REAL *output, DWT_REAL *workspace) {
+    int heights[DWT_MAX_LEVELS + 1];
+    int widths[DWT_MAX_LEVELS + 1];
+    int done = 0;
+
+    heights[0] = height;
+    widths[0] = width;
+    while (done < levels && done < DWT_MAX_LEVELS && (heights[done] > 1 || widths[done] > 1)) {
+        heights[done + 1] = (heights[done] + 1) / 2;
+        widths[done + 1] = (widths[done] + 1) / 2;
+        done++;
+    }
+
+    if (pyramid != output) memcpy(output, pyramid, sizeof(DWT_REAL) * height * width);
+    for (int level = done; level > 0; level--) {
+        int h = heights[level - 1];
+        int w = widths[level - 1];
+        DWT_NAME(haar_columns_inverse)(output, workspace, h, w, width);
+        for (int i = 0; i < h; i++) {
+            DWT_NAME(haar_row_inverse)(workspace + (size_t)i * width, output + (size_t)i * width, w);
+        }
+    }
+    return done;
+}
+
+// Frames [0, count) of contiguous count x H x W stacks, sharing one H x W workspace
+int DWT_NAME(dwt_2d_levels_batch)(int count, int height, int width, int levels, const DWT_REAL *input, DWT_REAL *pyramid, DWT_REAL *workspace) {
+    size_t frame = (size_t)height * width;
+    int done = 0;
+
+    for (int n = 0; n < count; n++) {
+        done = DWT_NAME(dwt_2d_levels)(height, width, levels, input + n * frame, pyramid + n * frame, workspace);
+    }
+    return done;
+}
+
+int DWT_NAME(idwt_2d_levels_batch)(int count, int height, int width, int levels, const DWT_REAL *pyramid, DWT_REAL *output, DWT_REAL *workspace) {
+    size_t frame = (size_t)height * width;
+    int done = 0;
+
+    for (int n = 0; n < count; n++) {
+        done = DWT_NAME(idwt_2d_levels)(height, width, levels, pyramid + n * frame, output + n * frame, workspace);
+    }
+    return done;
+}
@@ -2,21 +2,12 @@
 #include <stdlib.h>
 #include <math.h>
 #include <string.h>
+#include <stdint.h>
+#include <pthread.h>
+#include <unistd.h>
 
 #define BLOCK_SIZE 8 // 8x8 block size
 
-typedef struct HuffmanNode {
-    int symbol;         // (zero_count, value)
-    int frequency;      // freq
-    struct HuffmanNode *left;
-    struct HuffmanNode *right;
-} HuffmanNode;
-
-typedef struct PriorityQueueNode {
-    HuffmanNode *node;
-    struct PriorityQueueNode *next;
-} PriorityQueueNode;
-
 // Zig-Zag scan order
 int zigzag_order[BLOCK_SIZE * BLOCK_SIZE] = {
     0,  1,  5,  6, 14, 15, 27, 28,
@@ -145,192 +136,874 @@ int rle_encode(int *input, int size, int *output) {
 }
 
 
-PriorityQueueNode* enqueue(PriorityQueueNode *head, HuffmanNode *node) {
-    PriorityQueueNode *new_node = (PriorityQueueNode*)malloc(sizeof(PriorityQueueNode));
-    new_node->node = node;
-    new_node->next = NULL;
+// Compress a single 8x8 block into (zero run, value) pairs; returns the number of ints written
+// (entropy coding is done image-wide by jpeg_encode_image)
+int compress_block(double input[BLOCK_SIZE][BLOCK_SIZE], int *output) {
+    double dct_block[BLOCK_SIZE][BLOCK_SIZE];
+    int quantized_block[BLOCK_SIZE][BLOCK_SIZE];
+    int zigzagged_block[BLOCK_SIZE * BLOCK_SIZE];
+
+    // DCT
+    fast_dct_2d(input, dct_block);
+
+    // Quantization
+    quantize(dct_block, quantized_block);
 
-    if (!head || node->frequency < head->node->frequency) {
-        new_node->next = head;
-        return new_node;
+    // Zig-Zag
+    zigzag_scan(quantized_block, zigzagged_block);
+
+    // RLE
+    return rle_encode(zigzagged_block, BLOCK_SIZE * BLOCK_SIZE, output);
+}
+
+
+// ---------------------------------------------------------------------------
+// Image-level codec
+//
+// Build: gcc -O2 -fPIC -shared jpeg.c -o libjpeg.so -lm -lpthread
+//
+// Stream layout: "HJPG", version, quality, width (u32 LE), height (u32 LE),
+// the DC and AC Huffman tables (16 code-length counts + symbols each), then
+// the entropy-coded blocks in raster order. Each block codes its DC
+// difference from the previous block and its AC coefficients as
+// (run << 4 | size) symbols with ZRL (0xF0) and EOB (0x00), each followed by
+// its amplitude bits as in baseline JPEG. Both tables are canonical Huffman
+// codes built from the statistics of the whole image.
+// ---------------------------------------------------------------------------
+
+#define HEADER_SIZE 14
+#define STREAM_VERSION 2
+#define MAX_DIMENSION 65535  // largest width or height, as in baseline JPEG
+
+// Error codes of jpeg_encode_image
+#define JPEG_INVALID_ARGUMENT -1  // empty or oversized image, or a pixel outside 0..255
+#define JPEG_OUT_OF_MEMORY -2
+#define JPEG_BUFFER_TOO_SMALL -3  // capacity below the encoded size
+
+static double dct_matrix[BLOCK_SIZE][BLOCK_SIZE];  // dct_matrix[u][x] = a(u) cos((2x+1)u pi / 16)
+static double idct_matrix[BLOCK_SIZE][BLOCK_SIZE]; // transpose of dct_matrix
+static int zigzag_natural[BLOCK_SIZE * BLOCK_SIZE]; // zigzag position -> natural index
+static int tables_ready = 0;
+
+static void init_tables(void) {
+    if (tables_ready) return;
+    for (int u = 0; u < BLOCK_SIZE; u++) {
+        double a = u == 0 ? sqrt(1.0 / BLOCK_SIZE) : sqrt(2.0 / BLOCK_SIZE);
+        for (int x = 0; x < BLOCK_SIZE; x++) {
+            dct_matrix[u][x] = a * cos((2 * x + 1) * u * M_PI / (2 * BLOCK_SIZE));
+            idct_matrix[x][u] = dct_matrix[u][x];
+        }
     }
+    for (int i = 0; i < BLOCK_SIZE * BLOCK_SIZE; i++) {
+        zigzag_natural[zigzag_order[i]] = i;
+    }
+    tables_ready = 1;
+}
 
-    PriorityQueueNode *current = head;
-    while (current->next && current->next->node->frequency <= node->frequency) {
-        current = current->next;
+// IJG quality scaling of quant_table (quality 1..100, 50 = table as is)
+static void scaled_quant_table(int quality, int table[BLOCK_SIZE * BLOCK_SIZE]) {
+    if (quality < 1) quality = 1;
+    if (quality > 100) quality = 100;
+    int scale = quality < 50 ? 5000 / quality : 200 - 2 * quality;
+    for (int i = 0; i < BLOCK_SIZE * BLOCK_SIZE; i++) {
+        int q = (quant_table[i / BLOCK_SIZE][i % BLOCK_SIZE] * scale + 50) / 100;
+        table[i] = q < 1 ? 1 : (q > 255 ? 255 : q);
     }
-    new_node->next = current->next;
-    current->next = new_node;
-    return head;
 }
 
-HuffmanNode* dequeue(PriorityQueueNode **head) {
-    if (!(*head)) return NULL;
-    PriorityQueueNode *temp = *head;
-    HuffmanNode *node = temp->node;
-    *head = (*head)->next;
-    free(temp);
-    return node;
+// Orthonormal 8x8 DCT-II (inverse = 0) or DCT-III (inverse = 1), separable
+static void transform_8x8(const double in[BLOCK_SIZE * BLOCK_SIZE], double out[BLOCK_SIZE * BLOCK_SIZE], int inverse) {
+    const double (*m)[BLOCK_SIZE] = inverse ? idct_matrix : dct_matrix;
+    double temp[BLOCK_SIZE * BLOCK_SIZE];
+
+    // rows: temp = in * m^T
+    for (int i = 0; i < BLOCK_SIZE; i++) {
+        for (int u = 0; u < BLOCK_SIZE; u++) {
+            double sum = 0.0;
+            for (int x = 0; x < BLOCK_SIZE; x++) {
+                sum += m[u][x] * in[i * BLOCK_SIZE + x];
+            }
+            temp[i * BLOCK_SIZE + u] = sum;
+        }
+    }
+    // columns: out = m * temp
+    for (int u = 0; u < BLOCK_SIZE; u++) {
+        double row[BLOCK_SIZE] = {0};
+        for (int y = 0; y < BLOCK_SIZE; y++) {
+            double c = m[u][y];
+            for (int j = 0; j < BLOCK_SIZE; j++) {
+                row[j] += c * temp[y * BLOCK_SIZE + j];
+            }
+        }
+        memcpy(out + u * BLOCK_SIZE, row, sizeof(row));
+    }
 }
 
-HuffmanNode* build_huffman_tree(int *symbols, int *frequencies, int size) {
-    PriorityQueueNode *queue = NULL;
+// Level shift, DCT, quantization and zig-zag of the block at (bx, by); edges are replicated
+static void encode_block(const double *image, int width, int height, int bx, int by,
+                         const int qtable[BLOCK_SIZE * BLOCK_SIZE], int zz[BLOCK_SIZE * BLOCK_SIZE]) {
+    double block[BLOCK_SIZE * BLOCK_SIZE];
+    double coeffs[BLOCK_SIZE * BLOCK_SIZE];
 
-    for (int i = 0; i < size; i++) {
-        HuffmanNode *node = (HuffmanNode*)malloc(sizeof(HuffmanNode));
-        node->symbol = symbols[i];
-        node->frequency = frequencies[i];
-        node->left = NULL;
-        node->right = NULL;
-        queue = enqueue(queue, node);
+    for (int i = 0; i < BLOCK_SIZE; i++) {
+        int y = by * BLOCK_SIZE + i;
+        if (y >= height) y = height - 1;
+        for (int j = 0; j < BLOCK_SIZE; j++) {
+            int x = bx * BLOCK_SIZE + j;
+            if (x >= width) x = width - 1;
+            block[i * BLOCK_SIZE + j] = image[(size_t)y * width + x] - 128.0;
+        }
     }
+    transform_8x8(block, coeffs, 0);
+    for (int i = 0; i < BLOCK_SIZE * BLOCK_SIZE; i++) {
+        zz[zigzag_order[i]] = (int)round(coeffs[i] / qtable[i]);
+    }
+}
 
-    while (queue && queue->next) {
-        HuffmanNode *left = dequeue(&queue);
-        HuffmanNode *right = dequeue(&queue);
+// Dequantization, inverse zig-zag, IDCT and level shift of one block into the image
+static void decode_block(const int zz[BLOCK_SIZE * BLOCK_SIZE], const int qtable[BLOCK_SIZE * BLOCK_SIZE],
+                         int bx, int by, int width, int height, double *image) {
+    double coeffs[BLOCK_SIZE * BLOCK_SIZE];
+    double block[BLOCK_SIZE * BLOCK_SIZE];
 
-        HuffmanNode *new_node = (HuffmanNode*)malloc(sizeof(HuffmanNode));
-        new_node->symbol = -1; 
-        new_node->frequency = left->frequency + right->frequency;
-        new_node->left = left;
-        new_node->right = right;
-        queue = enqueue(queue, new_node);
+    for (int i = 0; i < BLOCK_SIZE * BLOCK_SIZE; i++) {
+        coeffs[i] = (double)zz[zigzag_order[i]] * qtable[i];
     }
+    transform_8x8(coeffs, block, 1);
+    for (int i = 0; i < BLOCK_SIZE; i++) {
+        int y = by * BLOCK_SIZE + i;
+        if (y >= height) break;
+        for (int j = 0; j < BLOCK_SIZE; j++) {
+            int x = bx * BLOCK_SIZE + j;
+            if (x >= width) break;
+            double v = block[i * BLOCK_SIZE + j] + 128.0;
+            image[(size_t)y * width + x] = v < 0.0 ? 0.0 : (v > 255.0 ? 255.0 : v);
+        }
+    }
+}
+
+// ---------------------------------------------------------------------------
+// Entropy coding: canonical Huffman tables built once per image
+// ---------------------------------------------------------------------------
+
+#define MAX_CODE_LENGTH 16
+#define LOOKAHEAD_BITS 9
+#define NUM_SYMBOLS 256
+
+typedef struct {
+    unsigned char bits[MAX_CODE_LENGTH + 1];  // bits[k] = number of codes of length k
+    unsigned char huffval[NUM_SYMBOLS];       // symbols in increasing code order
+    unsigned int code[NUM_SYMBOLS];           // encoder: code of each symbol
+    unsigned char size[NUM_SYMBOLS];          // encoder: code length of each symbol, 0 if unused
+    int maxcode[MAX_CODE_LENGTH + 1];         // decoder: largest code of each length, -1 if none
+    int valoffset[MAX_CODE_LENGTH + 1];       // decoder: huffval index minus first code of each length
+    unsigned short lookup[1 << LOOKAHEAD_BITS];  // decoder: (length << 8) | symbol, 0 for longer codes
+} HuffmanTable;
+
+/**
+ * Huffman code length of every symbol with a non-zero count (the Annex K.2 merging of
+ * libjpeg's jpeg_gen_optimal_table). Returns -1 if a code would be longer than
+ * 2 * MAX_CODE_LENGTH bits, which the length-limiting pass cannot handle.
+ */
+static int huffman_code_sizes(const long counts[NUM_SYMBOLS + 1], int codesize[NUM_SYMBOLS + 1]) {
+    long freq[NUM_SYMBOLS + 1];
+    int others[NUM_SYMBOLS + 1];
 
-    return dequeue(&queue); 
+    memset(codesize, 0, sizeof(int) * (NUM_SYMBOLS + 1));
+    for (int i = 0; i <= NUM_SYMBOLS; i++) others[i] = -1;
+    memcpy(freq, counts, sizeof(freq));
+
+    for (;;) {
+        // merge the two least frequent nodes (ties go to the larger symbol)
+        int c1 = -1, c2 = -1;
+        long v = 0x7FFFFFFFFFFFFFFFL;
+        for (int i = 0; i <= NUM_SYMBOLS; i++) {
+            if (freq[i] && freq[i] <= v) {
+                v = freq[i];
+                c1 = i;
+            }
+        }
+        v = 0x7FFFFFFFFFFFFFFFL;
+        for (int i = 0; i <= NUM_SYMBOLS; i++) {
+            if (freq[i] && freq[i] <= v && i != c1) {
+                v = freq[i];
+                c2 = i;
+            }
+        }
+        if (c2 < 0) break;
+
+        freq[c1] += freq[c2];
+        freq[c2] = 0;
+        codesize[c1]++;
+        while (others[c1] >= 0) {
+            c1 = others[c1];
+            codesize[c1]++;
+        }
+        others[c1] = c2;
+        codesize[c2]++;
+        while (others[c2] >= 0) {
+            c2 = others[c2];
+            codesize[c2]++;
+        }
+    }
+
+    for (int i = 0; i <= NUM_SYMBOLS; i++) {
+        if (codesize[i] > 2 * MAX_CODE_LENGTH) return -1;
+    }
+    return 0;
 }
 
-void generate_huffman_codes(HuffmanNode *root, char **codes, char *current_code, int depth) {
-    if (!root) return;
+/**
+ * Optimal code lengths limited to 16 bits (JPEG Annex K.2, as in libjpeg's
+ * jpeg_gen_optimal_table). A reserved pseudo-symbol keeps any code from being all ones.
+ */
+static void build_code_lengths(const long freq_in[NUM_SYMBOLS], HuffmanTable *table) {
+    long counts[NUM_SYMBOLS + 1];
+    int codesize[NUM_SYMBOLS + 1];
+    int bits[2 * MAX_CODE_LENGTH + 1];
 
-    if (root->left == NULL && root->right == NULL) {
-        current_code[depth] = '\0';
-        codes[root->symbol] = strdup(current_code);
-        return;
+    memset(bits, 0, sizeof(bits));
+    memcpy(counts, freq_in, sizeof(long) * NUM_SYMBOLS);
+    counts[NUM_SYMBOLS] = 1;
+    // libjpeg gives up on codes longer than 32 bits (possible only with very skewed counts);
+    // halve the counts instead, keeping them non-zero, until the tree is shallow enough
+    while (huffman_code_sizes(counts, codesize) != 0) {
+        for (int i = 0; i <= NUM_SYMBOLS; i++) {
+            if (counts[i]) counts[i] = (counts[i] + 1) / 2;
+        }
     }
 
-    current_code[depth] = '0';
-    generate_huffman_codes(root->left, codes, current_code, depth + 1);
+    for (int i = 0; i <= NUM_SYMBOLS; i++) {
+        if (codesize[i]) bits[codesize[i]]++;
+    }
+    // move overlong codes up the tree until every length fits in 16 bits
+    for (int i = 2 * MAX_CODE_LENGTH; i > MAX_CODE_LENGTH; i--) {
+        while (bits[i] > 0) {
+            int j = i - 2;
+            while (bits[j] == 0) j--;
+            bits[i] -= 2;
+            bits[i - 1]++;
+            bits[j + 1] += 2;
+            bits[j]--;
+        }
+    }
+    // drop the reserved pseudo-symbol's code (one of the longest)
+    int i = MAX_CODE_LENGTH;
+    while (bits[i] == 0) i--;
+    bits[i]--;
 
-    current_code[depth] = '1';
-    generate_huffman_codes(root->right, codes, current_code, depth + 1);
+    memset(table->bits, 0, sizeof(table->bits));
+    for (i = 1; i <= MAX_CODE_LENGTH; i++) table->bits[i] = (unsigned char)bits[i];
+    int p = 0;
+    for (int length = 1; length <= 2 * MAX_CODE_LENGTH; length++) {
+        for (int s = 0; s < NUM_SYMBOLS; s++) {
+            if (codesize[s] == length) table->huffval[p++] = (unsigned char)s;
+        }
+    }
 }
 
-int compress_block_with_huffman(double input[BLOCK_SIZE][BLOCK_SIZE]) {
-    double dct_block[BLOCK_SIZE][BLOCK_SIZE];
-    int quantized_block[BLOCK_SIZE][BLOCK_SIZE];
-    int zigzagged_block[BLOCK_SIZE * BLOCK_SIZE];
-    int rle_output[BLOCK_SIZE * BLOCK_SIZE * 2];
+/**
+ * Canonical codes for the encoder and lookup tables for the decoder from bits / huffval.
+ * Returns -1 if the lengths do not describe a valid prefix code.
+ */
+static int build_canonical_codes(HuffmanTable *table) {
+    unsigned int code = 0;
+    int p = 0;
 
-    fast_dct_2d(input, dct_block);
-    quantize(dct_block, quantized_block);
-    zigzag_scan(quantized_block, zigzagged_block);
-    int rle_size = rle_encode(zigzagged_block, BLOCK_SIZE * BLOCK_SIZE, rle_output);
+    memset(table->size, 0, sizeof(table->size));
+    memset(table->lookup, 0, sizeof(table->lookup));
+    for (int length = 1; length <= MAX_CODE_LENGTH; length++) {
+        table->valoffset[length] = p - (int)code;
+        for (int k = 0; k < table->bits[length]; k++, p++, code++) {
+            if (code >= (1u << length)) return -1;  // more codes than this length can hold
+            int symbol = table->huffval[p];
+            table->code[symbol] = code;
+            table->size[symbol] = (unsigned char)length;
+            if (length <= LOOKAHEAD_BITS) {
+                int shift = LOOKAHEAD_BITS - length;
+                for (int fill = 0; fill < (1 << shift); fill++) {
+                    table->lookup[(code << shift) | fill] = (unsigned short)((length << 8) | symbol);
+                }
+            }
+        }
+        table->maxcode[length] = table->bits[length] ? (int)code - 1 : -1;
+        code <<= 1;
+    }
+    return 0;
+}
 
-    printf("RLE Result:\n");
-    for (int i = 0; i < rle_size; i += 2) {
-        printf("(%d, %d) ", rle_output[i], rle_output[i + 1]);
+static int bit_length(int v) {
+    int n = 0;
+    if (v < 0) v = -v;
+    while (v) {
+        n++;
+        v >>= 1;
     }
-    printf("\n");
+    return n;
+}
 
-    int symbols[BLOCK_SIZE * BLOCK_SIZE] = {0};
-    int frequencies[BLOCK_SIZE * BLOCK_SIZE] = {0};
-    int symbol_count = 0;
-
-    for (int i = 0; i < rle_size; i += 2) {
-        int symbol = (rle_output[i] << 8) | (rle_output[i + 1] & 0xFF);
-        int found = 0;
-        for (int j = 0; j < symbol_count; j++) {
-            if (symbols[j] == symbol) {
-                frequencies[j]++;
-                found = 1;
-                break;
+// DC statistics of all blocks of the quantized zig-zag coefficients
+static void gather_dc_statistics(const short *coeffs, int num_blocks, long dc_freq[NUM_SYMBOLS]) {
+    int prev_dc = 0;
+    for (int b = 0; b < num_blocks; b++) {
+        int dc = coeffs[(size_t)b * BLOCK_SIZE * BLOCK_SIZE];
+        dc_freq[bit_length(dc - prev_dc)]++;
+        prev_dc = dc;
+    }
+}
+
+// AC statistics of blocks [first, last) of the quantized zig-zag coefficients
+static void gather_ac_statistics(const short *coeffs, int first, int last, long ac_freq[NUM_SYMBOLS]) {
+    for (int b = first; b < last; b++) {
+        const short *zz = coeffs + (size_t)b * BLOCK_SIZE * BLOCK_SIZE;
+        int run = 0;
+        for (int k = 1; k < BLOCK_SIZE * BLOCK_SIZE; k++) {
+            if (zz[k] == 0) {
+                run++;
+                continue;
             }
+            while (run > 15) {
+                ac_freq[0xF0]++;
+                run -= 16;
+            }
+            ac_freq[(run << 4) | bit_length(zz[k])]++;
+            run = 0;
         }
-        if (!found) {
-            symbols[symbol_count] = symbol;
-            frequencies[symbol_count] = 1;
-            symbol_count++;
-        }
+        if (run > 0) ac_freq[0x00]++;
     }
-    HuffmanNode *root = build_huffman_tree(symbols, frequencies, symbol_count);
-    char *codes[BLOCK_SIZE * BLOCK_SIZE] = {0};
-    char current_code[BLOCK_SIZE * BLOCK_SIZE];
-    generate_huffman_codes(root, codes, current_code, 0);
+}
 
+typedef struct {
+    unsigned char *buf;
+    size_t capacity;
+    size_t pos;
+    uint64_t acc;  // pending bits in the low `nbits` bits, always fewer than 32 between calls
+    int nbits;
+    int overflow;
+} BitWriter;
 
-    printf("Huffman Codes:\n");
-    for (int i = 0; i < symbol_count; i++) {
-        printf("Symbol %d: %s\n", symbols[i], codes[symbols[i]]);
+static inline void put_bits(BitWriter *w, uint32_t value, int n) {
+    w->acc = (w->acc << n) | (value & (uint32_t)((1ull << n) - 1));
+    w->nbits += n;
+    if (w->nbits >= 32) {
+        if (w->pos + 4 > w->capacity) {
+            w->overflow = 1;
+            w->nbits -= 32;
+            return;
+        }
+        uint32_t word = (uint32_t)(w->acc >> (w->nbits - 32));
+        w->buf[w->pos] = (unsigned char)(word >> 24);
+        w->buf[w->pos + 1] = (unsigned char)(word >> 16);
+        w->buf[w->pos + 2] = (unsigned char)(word >> 8);
+        w->buf[w->pos + 3] = (unsigned char)word;
+        w->pos += 4;
+        w->nbits -= 32;
     }
-    printf("\nHuffman Encoded Data:\n");
-    for (int i = 0; i < rle_size; i += 2) {
-        int symbol = (rle_output[i] << 8) | (rle_output[i + 1] & 0xFF);
-        printf("%s ", codes[symbol]);
+}
+
+// Pad the last byte with zeros and write out everything pending
+static void flush_bits(BitWriter *w) {
+    if (w->nbits & 7) put_bits(w, 0, 8 - (w->nbits & 7));
+    while (w->nbits > 0) {
+        if (w->pos >= w->capacity) {
+            w->overflow = 1;
+            return;
+        }
+        w->nbits -= 8;
+        w->buf[w->pos++] = (unsigned char)(w->acc >> w->nbits);
     }
-    printf("\n");
+}
 
-    return 0;
+typedef struct {
+    const unsigned char *buf;
+    size_t size;
+    size_t pos;
+    uint64_t acc;
+    int nbits;
+} BitReader;
+
+static inline void fill_bits(BitReader *r) {
+    while (r->nbits <= 56) {
+        r->acc = (r->acc << 8) | (r->pos < r->size ? r->buf[r->pos] : 0);
+        r->pos++;
+        r->nbits += 8;
+    }
 }
 
+static inline uint32_t peek_bits(BitReader *r, int n) {
+    return (uint32_t)(r->acc >> (r->nbits - n)) & (uint32_t)((1ull << n) - 1);
+}
 
-// Compress a single 8x8 block
-int compress_block(double input[BLOCK_SIZE][BLOCK_SIZE], int *output) {
-    double dct_block[BLOCK_SIZE][BLOCK_SIZE];
-    int quantized_block[BLOCK_SIZE][BLOCK_SIZE];
-    int zigzagged_block[BLOCK_SIZE * BLOCK_SIZE];
-    int rle_output[BLOCK_SIZE * BLOCK_SIZE * 2];  // 最大可能大小
+static inline uint32_t get_bits(BitReader *r, int n) {
+    if (n == 0) return 0;
+    if (r->nbits < n) fill_bits(r);
+    uint32_t value = peek_bits(r, n);
+    r->nbits -= n;
+    return value;
+}
 
-    // DCT
-    fast_dct_2d(input, dct_block);
+static inline int decode_symbol(BitReader *r, const HuffmanTable *table) {
+    if (r->nbits < MAX_CODE_LENGTH) fill_bits(r);
+    unsigned short entry = table->lookup[peek_bits(r, LOOKAHEAD_BITS)];
+    if (entry) {
+        r->nbits -= entry >> 8;
+        return entry & 0xFF;
+    }
+    int length = LOOKAHEAD_BITS + 1;
+    int code = (int)peek_bits(r, length);
+    while (code > table->maxcode[length]) {
+        if (++length > MAX_CODE_LENGTH) return -1;
+        code = (int)peek_bits(r, length);
+    }
+    r->nbits -= length;
+    return table->huffval[table->valoffset[length] + code];
+}
 
-    // Quantization
-    quantize(dct_block, quantized_block);
+// JPEG amplitude bits: negative values are stored as value - 1 in `size` bits
+static inline uint32_t amplitude_bits(int value) {
+    return (uint32_t)(value < 0 ? value - 1 : value);
+}
 
-    // Zig-Zag
-    zigzag_scan(quantized_block, zigzagged_block);
+static inline int get_amplitude(BitReader *r, int size) {
+    if (size == 0) return 0;
+    int v = (int)get_bits(r, size);
+    return v < (1 << (size - 1)) ? v - (1 << size) + 1 : v;
+}
 
-    // RLE
-    int rle_size = rle_encode(zigzagged_block, BLOCK_SIZE * BLOCK_SIZE, rle_output);
-
-    printf("gg/n");
-    int symbols[BLOCK_SIZE * BLOCK_SIZE] = {0};
-    int frequencies[BLOCK_SIZE * BLOCK_SIZE] = {0};
-    int symbol_count = 0;
-
-    for (int i = 0; i < rle_size; i += 2) {
-        int symbol = (rle_output[i] << 8) | (rle_output[i + 1] & 0xFF);
-        int found = 0;
-        for (int j = 0; j < symbol_count; j++) {
-            if (symbols[j] == symbol) {
-                frequencies[j]++;
-                found = 1;
-                break;
+static void encode_coefficients(BitWriter *w, const short *zz, int *prev_dc, const HuffmanTable *dc_table, const HuffmanTable *ac_table) {
+    int diff = zz[0] - *prev_dc;
+    int size = bit_length(diff);
+    *prev_dc = zz[0];
+    put_bits(w, (dc_table->code[size] << size) | (amplitude_bits(diff) & ((1u << size) - 1)), dc_table->size[size] + size);
+
+    int run = 0;
+    for (int k = 1; k < BLOCK_SIZE * BLOCK_SIZE; k++) {
+        if (zz[k] == 0) {
+            run++;
+            continue;
+        }
+        while (run > 15) {
+            put_bits(w, ac_table->code[0xF0], ac_table->size[0xF0]);
+            run -= 16;
+        }
+        size = bit_length(zz[k]);
+        int symbol = (run << 4) | size;
+        put_bits(w, (ac_table->code[symbol] << size) | (amplitude_bits(zz[k]) & ((1u << size) - 1)), ac_table->size[symbol] + size);
+        run = 0;
+    }
+    if (run > 0) put_bits(w, ac_table->code[0x00], ac_table->size[0x00]);
+}
+
+static int decode_coefficients(BitReader *r, int zz[BLOCK_SIZE * BLOCK_SIZE], int *prev_dc, const HuffmanTable *dc_table, const HuffmanTable *ac_table) {
+    memset(zz, 0, sizeof(int) * BLOCK_SIZE * BLOCK_SIZE);
+    int size = decode_symbol(r, dc_table);
+    if (size < 0 || size > MAX_CODE_LENGTH) return -1;
+    *prev_dc += get_amplitude(r, size);
+    zz[0] = *prev_dc;
+
+    for (int k = 1; k < BLOCK_SIZE * BLOCK_SIZE;) {
+        int symbol = decode_symbol(r, ac_table);
+        if (symbol < 0) return -1;
+        int run = symbol >> 4;
+        size = symbol & 15;
+        if (size == 0) {
+            if (run == 15) {
+                k += 16;
+                continue;
             }
+            break;  // EOB
         }
-        if (!found) {
-            symbols[symbol_count] = symbol;
-            frequencies[symbol_count] = 1;
-            symbol_count++;
+        k += run;
+        if (k >= BLOCK_SIZE * BLOCK_SIZE) return -1;
+        zz[k++] = get_amplitude(r, size);
+    }
+    return 0;
+}
+
+// Bytes of a table as stored in the stream: 16 code-length counts followed by the symbols
+static size_t table_size(const HuffmanTable *table) {
+    size_t count = 0;
+    for (int length = 1; length <= MAX_CODE_LENGTH; length++) count += table->bits[length];
+    return MAX_CODE_LENGTH + count;
+}
+
+static size_t write_table(unsigned char *out, const HuffmanTable *table) {
+    size_t count = 0;
+    for (int length = 1; length <= MAX_CODE_LENGTH; length++) {
+        out[length - 1] = table->bits[length];
+        count += table->bits[length];
+    }
+    memcpy(out + MAX_CODE_LENGTH, table->huffval, count);
+    return MAX_CODE_LENGTH + count;
+}
+
+static long read_table(const unsigned char *in, size_t size, HuffmanTable *table) {
+    size_t count = 0;
+    if (size < MAX_CODE_LENGTH) return -1;
+    table->bits[0] = 0;
+    for (int length = 1; length <= MAX_CODE_LENGTH; length++) {
+        table->bits[length] = in[length - 1];
+        count += in[length - 1];
+    }
+    if (count > NUM_SYMBOLS || size < MAX_CODE_LENGTH + count) return -1;
+    memcpy(table->huffval, in + MAX_CODE_LENGTH, count);
+    if (build_canonical_codes(table) != 0) return -1;
+    return (long)(MAX_CODE_LENGTH + count);
+}
+
+// ---------------------------------------------------------------------------
+// Strip-parallel encoding
+//
+// The frame is cut into strips of whole block rows. Pass 1 (DCT, quantization,
+// AC statistics) and pass 2 (entropy coding into a per-strip buffer) run strip
+// by strip on a small thread pool; DC prediction across strip boundaries uses
+// the previous strip's last DC, and the strips are concatenated bit by bit, so
+// the stream is identical for any number of threads.
+// ---------------------------------------------------------------------------
+
+#define MAX_THREADS 64
+#define STRIPS_PER_THREAD 4
+#define MAX_BLOCK_BYTES 272  // worst case: 32 DC bits + 63 * 31 AC bits + 3 ZRL + EOB
+
+static int num_threads = 0;  // 0 = one per online CPU
+
+/**
+ * Number of threads used by jpeg_encode_image (0 = one per online CPU).
+ */
+void jpeg_set_num_threads(int n) {
+    num_threads = n < 0 ? 0 : n;
+}
+
+static int thread_count(void) {
+    if (num_threads > 0) return num_threads < MAX_THREADS ? num_threads : MAX_THREADS;
+    long n = sysconf(_SC_NPROCESSORS_ONLN);
+    return n < 1 ? 1 : (n > MAX_THREADS ? MAX_THREADS : (int)n);
+}
+
+typedef struct {
+    void (*task)(void *ctx, int index);
+    void *ctx;
+    int num_tasks;
+    int next;
+    pthread_mutex_t lock;
+} TaskQueue;
+
+static void *task_worker(void *arg) {
+    TaskQueue *queue = (TaskQueue *)arg;
+    for (;;) {
+        pthread_mutex_lock(&queue->lock);
+        int index = queue->next++;
+        pthread_mutex_unlock(&queue->lock);
+        if (index >= queue->num_tasks) return NULL;
+        queue->task(queue->ctx, index);
+    }
+}
+
+// Run task(ctx, 0 .. num_tasks - 1) on up to `threads` threads, the calling thread included
+static void run_tasks(int threads, int num_tasks, void (*task)(void *, int), void *ctx) {
+    TaskQueue queue = {task, ctx, num_tasks, 0, PTHREAD_MUTEX_INITIALIZER};
+    pthread_t workers[MAX_THREADS];
+    int started = 0;
+
+    if (threads > num_tasks) threads = num_tasks;
+    for (int i = 1; i < threads; i++) {
+        if (pthread_create(&workers[started], NULL, task_worker, &queue) == 0) started++;
+    }
+    task_worker(&queue);
+    for (int i = 0; i < started; i++) pthread_join(workers[i], NULL);
+    pthread_mutex_destroy(&queue.lock);
+}
+
+typedef struct {
+    const double *image;
+    int width;
+    int height;
+    int blocks_x;
+    int blocks_y;
+    int rows_per_strip;
+    const int *qtable;
+    short *coeffs;
+    long (*ac_freq)[NUM_SYMBOLS];  // per strip
+    const HuffmanTable *dc_table;
+    const HuffmanTable *ac_table;
+    unsigned char *strip_buf;      // MAX_BLOCK_BYTES per block
+    size_t *strip_bits;            // per strip
+    int *strip_overflow;           // per strip
+} EncodeJob;
+
+static void strip_blocks(const EncodeJob *job, int strip, int *first, int *last) {
+    int by0 = strip * job->rows_per_strip;
+    int by1 = by0 + job->rows_per_strip < job->blocks_y ? by0 + job->rows_per_strip : job->blocks_y;
+    *first = by0 * job->blocks_x;
+    *last = by1 * job->blocks_x;
+}
+
+// Pass 1: quantized coefficients and AC statistics of one strip
+static void quantize_strip(void *arg, int strip) {
+    EncodeJob *job = (EncodeJob *)arg;
+    int zz[BLOCK_SIZE * BLOCK_SIZE];
+    int first, last;
+
+    strip_blocks(job, strip, &first, &last);
+    for (int b = first; b < last; b++) {
+        short *dst = job->coeffs + (size_t)b * BLOCK_SIZE * BLOCK_SIZE;
+        encode_block(job->image, job->width, job->height, b % job->blocks_x, b / job->blocks_x, job->qtable, zz);
+        for (int k = 0; k < BLOCK_SIZE * BLOCK_SIZE; k++) dst[k] = (short)zz[k];
+    }
+    memset(job->ac_freq[strip], 0, sizeof(long) * NUM_SYMBOLS);
+    gather_ac_statistics(job->coeffs, first, last, job->ac_freq[strip]);
+}
+
+// Pass 2: entropy coding of one strip into its own buffer
+static void entropy_code_strip(void *arg, int strip) {
+    EncodeJob *job = (EncodeJob *)arg;
+    int first, last;
+
+    strip_blocks(job, strip, &first, &last);
+    BitWriter w = {job->strip_buf + (size_t)first * MAX_BLOCK_BYTES, (size_t)(last - first) * MAX_BLOCK_BYTES, 0, 0, 0, 0};
+    int prev_dc = first > 0 ? job->coeffs[(size_t)(first - 1) * BLOCK_SIZE * BLOCK_SIZE] : 0;
+    for (int b = first; b < last; b++) {
+        encode_coefficients(&w, job->coeffs + (size_t)b * BLOCK_SIZE * BLOCK_SIZE, &prev_dc, job->dc_table, job->ac_table);
+    }
+    job->strip_bits[strip] = w.pos * 8 + w.nbits;
+    flush_bits(&w);
+    job->strip_overflow[strip] = w.overflow;
+}
+
+// Append the first `bits` bits of `src` to the writer
+static void append_bits(BitWriter *w, const unsigned char *src, size_t bits) {
+    size_t bytes = bits / 8;
+    size_t i = 0;
+    for (; i + 4 <= bytes; i += 4) {
+        put_bits(w, ((uint32_t)src[i] << 24) | ((uint32_t)src[i + 1] << 16) | ((uint32_t)src[i + 2] << 8) | src[i + 3], 32);
+    }
+    for (; i < bytes; i++) put_bits(w, src[i], 8);
+    if (bits & 7) put_bits(w, src[bytes] >> (8 - (bits & 7)), (int)(bits & 7));
+}
+
+static void put_u32(unsigned char *p, unsigned int v) {
+    for (int i = 0; i < 4; i++) p[i] = (unsigned char)(v >> (8 * i));
+}
+
+static unsigned int get_u32(const unsigned char *p) {
+    return p[0] | (p[1] << 8) | (p[2] << 16) | ((unsigned int)p[3] << 24);
+}
+
+/**
+ * Upper bound of the size of jpeg_encode_image output for a width x height image,
+ * or -1 if the size is invalid or the bound does not fit in an int.
+ */
+int jpeg_max_encoded_size(int width, int height) {
+    if (width <= 0 || height <= 0 || width > MAX_DIMENSION || height > MAX_DIMENSION) return -1;
+    size_t blocks = (size_t)((width + BLOCK_SIZE - 1) / BLOCK_SIZE) * ((height + BLOCK_SIZE - 1) / BLOCK_SIZE);
+    size_t bound = HEADER_SIZE + 2 * (MAX_CODE_LENGTH + NUM_SYMBOLS) + blocks * MAX_BLOCK_BYTES;
+    return bound > 0x7FFFFFFF ? -1 : (int)bound;
+}
+
+/**
+ * Encode a width x height grayscale image (0..255, row-major doubles) into `out`.
+ * Returns the number of bytes written, or JPEG_INVALID_ARGUMENT, JPEG_OUT_OF_MEMORY or
+ * JPEG_BUFFER_TOO_SMALL (never for capacity >= jpeg_max_encoded_size(width, height)).
+ */
+int jpeg_encode_image(const double *image, int width, int height, int quality, unsigned char *out, int capacity) {
+    int qtable[BLOCK_SIZE * BLOCK_SIZE];
+    long dc_freq[NUM_SYMBOLS] = {0};
+    long ac_freq[NUM_SYMBOLS] = {0};
+    HuffmanTable dc_table, ac_table;
+    EncodeJob job;
+
+    if (width <= 0 || height <= 0 || width > MAX_DIMENSION || height > MAX_DIMENSION) return JPEG_INVALID_ARGUMENT;
+    // in range, every coefficient fits a short and every magnitude category is at most 12; NaN fails too
+    for (size_t i = 0; i < (size_t)width * height; i++) {
+        if (!(image[i] >= 0.0 && image[i] <= 255.0)) return JPEG_INVALID_ARGUMENT;
+    }
+    if (capacity < HEADER_SIZE) return JPEG_BUFFER_TOO_SMALL;
+    init_tables();
+    scaled_quant_table(quality, qtable);
+
+    int threads = thread_count();
+    int blocks_x = (width + BLOCK_SIZE - 1) / BLOCK_SIZE;
+    int blocks_y = (height + BLOCK_SIZE - 1) / BLOCK_SIZE;
+    int num_blocks = blocks_x * blocks_y;
+    int rows_per_strip = (blocks_y + threads * STRIPS_PER_THREAD - 1) / (threads * STRIPS_PER_THREAD);
+    int num_strips = (blocks_y + rows_per_strip - 1) / rows_per_strip;
+
+    job.image = image;
+    job.width = width;
+    job.height = height;
+    job.blocks_x = blocks_x;
+    job.blocks_y = blocks_y;
+    job.rows_per_strip = rows_per_strip;
+    job.qtable = qtable;
+    job.dc_table = &dc_table;
+    job.ac_table = &ac_table;
+    job.coeffs = (short *)malloc(sizeof(short) * num_blocks * BLOCK_SIZE * BLOCK_SIZE);
+    job.ac_freq = malloc(sizeof(long) * NUM_SYMBOLS * num_strips);
+    job.strip_buf = (unsigned char *)malloc((size_t)num_blocks * MAX_BLOCK_BYTES);
+    job.strip_bits = (size_t *)malloc(sizeof(size_t) * num_strips);
+    job.strip_overflow = (int *)malloc(sizeof(int) * num_strips);
+    int result = JPEG_OUT_OF_MEMORY;
+    if (!job.coeffs || !job.ac_freq || !job.strip_buf || !job.strip_bits || !job.strip_overflow) goto done;
+
+    // Pass 1: quantized coefficients of every block and the image-wide symbol statistics
+    run_tasks(threads, num_strips, quantize_strip, &job);
+    gather_dc_statistics(job.coeffs, num_blocks, dc_freq);
+    for (int s = 0; s < num_strips; s++) {
+        for (int k = 0; k < NUM_SYMBOLS; k++) ac_freq[k] += job.ac_freq[s][k];
+    }
+    build_code_lengths(dc_freq, &dc_table);
+    build_code_lengths(ac_freq, &ac_table);
+    build_canonical_codes(&dc_table);
+    build_canonical_codes(&ac_table);
+
+    memcpy(out, "HJPG", 4);
+    out[4] = STREAM_VERSION;
+    out[5] = (unsigned char)(quality < 1 ? 1 : (quality > 100 ? 100 : quality));
+    put_u32(out + 6, (unsigned int)width);
+    put_u32(out + 10, (unsigned int)height);
+
+    size_t pos = HEADER_SIZE;
+    result = JPEG_BUFFER_TOO_SMALL;
+    if ((size_t)capacity < pos + table_size(&dc_table) + table_size(&ac_table)) goto done;
+    pos += write_table(out + pos, &dc_table);
+    pos += write_table(out + pos, &ac_table);
+
+    // Pass 2: entropy coding of the strips, then their concatenation
+    run_tasks(threads, num_strips, entropy_code_strip, &job);
+    BitWriter w = {out + pos, (size_t)capacity - pos, 0, 0, 0, 0};
+    for (int s = 0; s < num_strips && !w.overflow; s++) {
+        if (job.strip_overflow[s]) goto done;
+        append_bits(&w, job.strip_buf + (size_t)s * rows_per_strip * blocks_x * MAX_BLOCK_BYTES, job.strip_bits[s]);
+    }
+    flush_bits(&w);
+    if (!w.overflow) result = (int)(pos + w.pos);
+
+done:
+    free(job.coeffs);
+    free(job.ac_freq);
+    free(job.strip_buf);
+    free(job.strip_bits);
+    free(job.strip_overflow);
+    return result;
+}
+
+/**
+ * Read the image size from an encoded stream. Returns 0, or -1 if it is not a valid stream.
+ * The size is checked against the stream length before anyone allocates the image:
+ * every block takes at least two bits (a DC and an AC code).
+ */
+int jpeg_image_size(const unsigned char *in, int size, int *width, int *height) {
+    if (size < HEADER_SIZE || memcmp(in, "HJPG", 4) != 0 || in[4] != STREAM_VERSION) return -1;
+    unsigned int w = get_u32(in + 6);
+    unsigned int h = get_u32(in + 10);
+    if (w == 0 || h == 0 || w > MAX_DIMENSION || h > MAX_DIMENSION) return -1;
+    size_t blocks = (size_t)((w + BLOCK_SIZE - 1) / BLOCK_SIZE) * ((h + BLOCK_SIZE - 1) / BLOCK_SIZE);
+    if (blocks * 2 > (size_t)(size - HEADER_SIZE) * 8) return -1;
+    *width = (int)w;
+    *height = (int)h;
+    return 0;
+}
+
+/**
+ * Decode a stream from jpeg_encode_image into `image` (width x height doubles).
+ * Returns 0, or -1 on a malformed stream.
+ */
+int jpeg_decode_image(const unsigned char *in, int size, double *image) {
+    int width, height;
+    int qtable[BLOCK_SIZE * BLOCK_SIZE];
+    int zz[BLOCK_SIZE * BLOCK_SIZE];
+    HuffmanTable dc_table, ac_table;
+
+    if (jpeg_image_size(in, size, &width, &height) != 0) return -1;
+    init_tables();
+    scaled_quant_table(in[5], qtable);
+
+    size_t pos = HEADER_SIZE;
+    long n = read_table(in + pos, size - pos, &dc_table);
+    if (n < 0) return -1;
+    pos += n;
+    n = read_table(in + pos, size - pos, &ac_table);
+    if (n < 0) return -1;
+    pos += n;
+
+    BitReader r = {in + pos, (size_t)size - pos, 0, 0, 0};
+    int blocks_x = (width + BLOCK_SIZE - 1) / BLOCK_SIZE;
+    int blocks_y = (height + BLOCK_SIZE - 1) / BLOCK_SIZE;
+    int prev_dc = 0;
+    size_t available = r.size * 8;
+    for (int by = 0; by < blocks_y; by++) {
+        for (int bx = 0; bx < blocks_x; bx++) {
+            if (decode_coefficients(&r, zz, &prev_dc, &dc_table, &ac_table) != 0) return -1;
+            // the reader pads with zeros past the end; a block that needed them is truncated
+            if (r.pos * 8 - r.nbits > available) return -1;
+            decode_block(zz, qtable, bx, by, width, height, image);
         }
     }
+    return 0;
+}
 
-    HuffmanNode *root = build_huffman_tree(symbols, frequencies, symbol_count);
-    char *codes[BLOCK_SIZE * BLOCK_SIZE] = {0};
-    char current_code[BLOCK_SIZE * BLOCK_SIZE];
-    generate_huffman_codes(root, codes, current_code, 0);
+/**
+ * N x N image at quality 50; the encoded bytes are packed into the int buffer `compressed`.
+ * On entry *compressed_size is its capacity in ints (enough: jpeg_max_encoded_size(N, N)
+ * bytes), on return the number of ints used. Returns 0 or a jpeg_encode_image error code.
+ */
+int jpeg_compress(int N, double *image, int *compressed, int *compressed_size) {
+    int capacity = *compressed_size > 0x7FFFFFFF / (int)sizeof(int) ? 0x7FFFFFFF : *compressed_size * (int)sizeof(int);
+    int bytes = jpeg_encode_image(image, N, N, 50, (unsigned char *)compressed, capacity);
+    *compressed_size = bytes < 0 ? 0 : (bytes + (int)sizeof(int) - 1) / (int)sizeof(int);
+    return bytes < 0 ? bytes : 0;
+}
+
+void jpeg_decompress(int N, int *compressed, int size, double *image) {
+    int width, height;
+    const unsigned char *in = (const unsigned char *)compressed;
+    int bytes = size * (int)sizeof(int);
 
-    printf("Huffman Encoded Data:\n");
-    for (int i = 0; i < rle_size; i += 2) {
-        int symbol = (rle_output[i] << 8) | (rle_output[i + 1] & 0xFF);
-        printf("%s ", codes[symbol]);
+    if (jpeg_image_size(in, bytes, &width, &height) != 0 || width != N || height != N) {
+        memset(image, 0, sizeof(double) * N * N);
+        return;
     }
-    printf("\n");
+    if (jpeg_decode_image(in, bytes, image) != 0) {
+        memset(image, 0, sizeof(double) * N * N);
+    }
+}
+
+/**
+ * Quantized zig-zag coefficients (quality 50) of every full 8x8 block, 64 ints per
+ * block in raster block order.
+ */
+void compress_image(double *image, int width, int height, int *compressed) {
+    int qtable[BLOCK_SIZE * BLOCK_SIZE];
+    init_tables();
+    scaled_quant_table(50, qtable);
 
-    return rle_size;
+    int blocks_x = width / BLOCK_SIZE;
+    int blocks_y = height / BLOCK_SIZE;
+    for (int by = 0; by < blocks_y; by++) {
+        for (int bx = 0; bx < blocks_x; bx++) {
+            encode_block(image, width, height, bx, by, qtable,
+                         compressed + ((size_t)by * blocks_x + bx) * BLOCK_SIZE * BLOCK_SIZE);
+        }
+    }
 }
 
+/**
+ * Inverse of compress_image: rebuild the full 8x8 blocks of the image from their coefficients.
+ */
+void decompress_image(int *compressed, int width, int height, double *image) {
+    int qtable[BLOCK_SIZE * BLOCK_SIZE];
+    init_tables();
+    scaled_quant_table(50, qtable);
 
+    int blocks_x = width / BLOCK_SIZE;
+    int blocks_y = height / BLOCK_SIZE;
+    for (int by = 0; by < blocks_y; by++) {
+        for (int bx = 0; bx < blocks_x; bx++) {
+            decode_block(compressed + ((size_t)by * blocks_x + bx) * BLOCK_SIZE * BLOCK_SIZE,
+                         qtable, bx, by, width, height, image);
+        }
+    }
+}
 
 
 // Main function for testing
@@ -347,7 +1020,13 @@ int main() {
     };
 
     int compressed[BLOCK_SIZE * BLOCK_SIZE * 2];  // Max possible size
-    compress_block(input_block, compressed);
+    int size = compress_block(input_block, compressed);
+
+    printf("RLE Result:\n");
+    for (int i = 0; i < size; i += 2) {
+        printf("(%d, %d) ", compressed[i], compressed[i + 1]);
+    }
+    printf("\n");
 
     return 0;
 }
@@ -1,32 +1,136 @@
 import ctypes
+import math
 import numpy as np
 
-# Load the shared library
-jpeg = ctypes.CDLL('./libjpeg_image.so')
+import backends
 
-# Define the C function signature
-jpeg.compress_image.argtypes = [
-    np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS"),  # Image array
-    ctypes.c_int,  # Width
-    ctypes.c_int,  # Height
-    np.ctypeslib.ndpointer(dtype=np.int32, flags="C_CONTIGUOUS")     # Output compressed data
-]
-jpeg.compress_image.restype = None
+# compress_image / decompress_image come from the JPEG library
+# (gcc -O2 -fPIC -shared jpeg.c -o libjpeg.so -lm -lpthread), loaded on first use from this
+# directory; without it (or when it is slower) the NumPy versions below, which give
+# bit-identical results (test_jpeg.py), are used
 
-def compress_image(image):
+def _configure(jpeg):
+    # Define the C function signature
+    jpeg.compress_image.argtypes = [
+        np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS"),  # Image array
+        ctypes.c_int,  # Width
+        ctypes.c_int,  # Height
+        np.ctypeslib.ndpointer(dtype=np.int32, flags="C_CONTIGUOUS")     # Output compressed data
+    ]
+    jpeg.compress_image.restype = None
+
+    jpeg.decompress_image.argtypes = [
+        np.ctypeslib.ndpointer(dtype=np.int32, flags="C_CONTIGUOUS"),    # Compressed data
+        ctypes.c_int,  # Width
+        ctypes.c_int,  # Height
+        np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")   # Output image
+    ]
+    jpeg.decompress_image.restype = None
+
+backends.on_load('jpeg', _configure)
+
+# quant_table and zigzag_order of jpeg.c (zig-zag position of each row-major index)
+QUANT_TABLE = np.array([
+    [16, 11, 10, 16, 24, 40, 51, 61],
+    [12, 12, 14, 19, 26, 58, 60, 55],
+    [14, 13, 16, 24, 40, 57, 69, 56],
+    [14, 17, 22, 29, 51, 87, 80, 62],
+    [18, 22, 37, 56, 68, 109, 103, 77],
+    [24, 35, 55, 64, 81, 104, 113, 92],
+    [49, 64, 78, 87, 103, 121, 120, 101],
+    [72, 92, 95, 98, 112, 100, 103, 99]
+], dtype=np.float64)
+ZIGZAG_ORDER = np.array([
+    0, 1, 5, 6, 14, 15, 27, 28,
+    2, 4, 7, 13, 16, 26, 29, 42,
+    3, 8, 12, 17, 25, 30, 41, 43,
+    9, 11, 18, 24, 31, 40, 44, 53,
+    10, 19, 23, 32, 39, 45, 52, 54,
+    20, 22, 33, 38, 46, 51, 55, 60,
+    21, 34, 37, 47, 50, 56, 59, 61,
+    35, 36, 48, 49, 57, 58, 62, 63
+])
+
+# Orthonormal DCT-II matrix: DCT_MATRIX[u, x] = a(u) cos((2x + 1) u pi / 16), built with
+# libm's cos like dct_matrix in jpeg.c so that both backends start from the same values
+DCT_MATRIX = np.array([[(math.sqrt(1 / 8) if u == 0 else math.sqrt(2 / 8)) * math.cos((2 * x + 1) * u * math.pi / 16)
+                        for x in range(8)] for u in range(8)])
+
+def _matmul_in_order(a, b):
     """
-    Compress an entire image using the C library.
+    a @ b with every sum accumulated left to right, as the loops of transform_8x8 do,
+    so the result is bit-identical to the C code (np.matmul may reorder or block the sums).
     """
+    out = a[..., :, :1] * b[..., :1, :]
+    for k in range(1, a.shape[-1]):
+        out = out + a[..., :, k:k + 1] * b[..., k:k + 1, :]
+    return out
+
+def _round_half_away(x):
+    """
+    C round(): halfway cases away from zero. x - trunc(x) is exact, unlike floor(|x| + 0.5).
+    """
+    t = np.trunc(x)
+    return t + np.sign(x) * (np.abs(x - t) >= 0.5)
+
+def _numpy_compress_image(image):
     height, width = image.shape
-    compressed_size = (width // 8) * (height // 8) * 64
-    compressed = np.zeros(compressed_size, dtype=np.int32)
+    by, bx = height // 8, width // 8
+    blocks = (image[:by * 8, :bx * 8] - 128.0).reshape(by, 8, bx, 8).transpose(0, 2, 1, 3)
+    # rows then columns, like transform_8x8
+    coeffs = _matmul_in_order(DCT_MATRIX, _matmul_in_order(blocks, DCT_MATRIX.T)) / QUANT_TABLE
+    compressed = np.empty((by, bx, 64), dtype=np.int32)
+    compressed[..., ZIGZAG_ORDER] = _round_half_away(coeffs).reshape(by, bx, 64)
+    return compressed.ravel()
+
+def _numpy_decompress_image(compressed, width, height):
+    by, bx = height // 8, width // 8
+    coeffs = compressed.reshape(by, bx, 64)[..., ZIGZAG_ORDER].reshape(by, bx, 8, 8) * QUANT_TABLE
+    blocks = np.clip(_matmul_in_order(DCT_MATRIX.T, _matmul_in_order(coeffs, DCT_MATRIX)) + 128.0, 0, 255)
+    image = np.zeros((height, width), dtype=np.float64)
+    image[:by * 8, :bx * 8] = blocks.transpose(0, 2, 1, 3).reshape(by * 8, bx * 8)
+    return image
 
-    jpeg.compress_image(image.astype(np.float64), width, height, compressed)
+def _native_compress_image(image):
+    height, width = image.shape
+    compressed = np.zeros((width // 8) * (height // 8) * 64, dtype=np.int32)
+    backends.require('jpeg').compress_image(image, width, height, compressed)
     return compressed
 
-# Example usage
-image = np.random.randint(0, 256, (16, 16), dtype=np.uint8)  # Example 16x16 image
-compressed_data = compress_image(image)
+def _native_decompress_image(compressed, width, height):
+    image = np.zeros((height, width), dtype=np.float64)
+    backends.require('jpeg').decompress_image(compressed, width, height, image)
+    return image
+
+def _sample_image():
+    return (np.random.default_rng(0).integers(0, 256, (256, 256)).astype(np.float64),)
+
+def _sample_coefficients():
+    return _numpy_compress_image(*_sample_image()), 256, 256
+
+backends.register('compress_image', _numpy_compress_image, _native_compress_image, 'jpeg', _sample_image)
+backends.register('decompress_image', _numpy_decompress_image, _native_decompress_image, 'jpeg', _sample_coefficients)
+
+def compress_image(image):
+    """
+    Compress an entire image: quantized zig-zag coefficients (quality 50) of every
+    full 8x8 block, 64 per block in raster block order.
+    """
+    return backends.get('compress_image')(np.ascontiguousarray(image, dtype=np.float64))
+
+def decompress_image(compressed, width, height):
+    """
+    Rebuild the image from compress_image output (pixels outside full blocks stay 0).
+    """
+    return backends.get('decompress_image')(np.ascontiguousarray(compressed, dtype=np.int32), width, height)
+
+def main():
+    # Example usage
+    image = np.random.randint(0, 256, (16, 16), dtype=np.uint8)  # Example 16x16 image
+    compressed_data = compress_image(image)
+
+    print("Compressed Data:")
+    print(compressed_data)
 
-print("Compressed Data:")
-print(compressed_data)
+if __name__ == "__main__":
+    main()
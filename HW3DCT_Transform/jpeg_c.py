@@ -1,47 +1,114 @@
 import numpy as np
 import ctypes
 
-# Load the JPEG shared library
-jpeg = ctypes.CDLL('./libjpeg.so')
-
-# Define the function interfaces
-jpeg.jpeg_compress.argtypes = [
-    ctypes.c_int,  # Matrix size N
-    ctypes.POINTER(ctypes.c_double),  # Input image pointer
-    ctypes.POINTER(ctypes.c_int),  # Output compressed data pointer
-    ctypes.POINTER(ctypes.c_int)   # Size of compressed data
-]
-jpeg.jpeg_compress.restype = None
-
-jpeg.jpeg_decompress.argtypes = [
-    ctypes.c_int,  # Matrix size N
-    ctypes.POINTER(ctypes.c_int),  # Input compressed data pointer
-    ctypes.c_int,  # Size of compressed data
-    ctypes.POINTER(ctypes.c_double)  # Output decompressed image pointer
-]
-jpeg.jpeg_decompress.restype = None
+import backends
+
+# The codec lives in the JPEG library (gcc -O2 -fPIC -shared jpeg.c -o libjpeg.so -lm -lpthread),
+# loaded on first use from this directory; it has no NumPy fallback
+
+def _configure(jpeg):
+    # Define the function interfaces
+    jpeg.jpeg_compress.argtypes = [
+        ctypes.c_int,  # Matrix size N
+        ctypes.POINTER(ctypes.c_double),  # Input image pointer
+        ctypes.POINTER(ctypes.c_int),  # Output compressed data pointer
+        ctypes.POINTER(ctypes.c_int)   # Size of compressed data
+    ]
+    jpeg.jpeg_compress.restype = ctypes.c_int
+
+    jpeg.jpeg_decompress.argtypes = [
+        ctypes.c_int,  # Matrix size N
+        ctypes.POINTER(ctypes.c_int),  # Input compressed data pointer
+        ctypes.c_int,  # Size of compressed data
+        ctypes.POINTER(ctypes.c_double)  # Output decompressed image pointer
+    ]
+    jpeg.jpeg_decompress.restype = None
+
+    jpeg.jpeg_encode_image.argtypes = [
+        np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS"),  # Input image
+        ctypes.c_int,  # Width
+        ctypes.c_int,  # Height
+        ctypes.c_int,  # Quality (1..100)
+        np.ctypeslib.ndpointer(dtype=np.uint8, flags="C_CONTIGUOUS"),  # Output buffer
+        ctypes.c_int   # Output buffer capacity
+    ]
+    jpeg.jpeg_encode_image.restype = ctypes.c_int
+
+    jpeg.jpeg_max_encoded_size.argtypes = [ctypes.c_int, ctypes.c_int]  # Width, height
+    jpeg.jpeg_max_encoded_size.restype = ctypes.c_int
+
+    jpeg.jpeg_image_size.argtypes = [
+        np.ctypeslib.ndpointer(dtype=np.uint8, flags="C_CONTIGUOUS"),  # Encoded stream
+        ctypes.c_int,  # Stream size
+        ctypes.POINTER(ctypes.c_int),  # Width
+        ctypes.POINTER(ctypes.c_int)   # Height
+    ]
+    jpeg.jpeg_image_size.restype = ctypes.c_int
+
+    jpeg.jpeg_decode_image.argtypes = [
+        np.ctypeslib.ndpointer(dtype=np.uint8, flags="C_CONTIGUOUS"),  # Encoded stream
+        ctypes.c_int,  # Stream size
+        np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")  # Output image
+    ]
+    jpeg.jpeg_decode_image.restype = ctypes.c_int
+
+    jpeg.jpeg_set_num_threads.argtypes = [ctypes.c_int]  # Encoder threads (0 = one per CPU)
+    jpeg.jpeg_set_num_threads.restype = None
+
+backends.on_load('jpeg', _configure)
+
+# error codes of jpeg_encode_image / jpeg_compress
+_ENCODE_ERRORS = {
+    -1: (ValueError, "image must be non-empty with values in 0..255"),
+    -2: (MemoryError, "out of memory in the JPEG encoder"),
+    -3: (RuntimeError, "JPEG output buffer too small"),
+}
+
+def _check_encode(result):
+    if result < 0:
+        error, message = _ENCODE_ERRORS.get(result, (RuntimeError, f"JPEG encoder failed ({result})"))
+        raise error(message)
+    return result
+
+def _max_encoded_size(jpeg, width, height):
+    capacity = jpeg.jpeg_max_encoded_size(width, height)
+    if capacity < 0:
+        raise ValueError(f"cannot encode a {width}x{height} image")
+    return capacity
+
+def set_num_threads(n):
+    """
+    Number of threads the encoder splits the frame over (0 = one per CPU).
+    The encoded stream does not depend on it.
+    """
+    jpeg = backends.require('jpeg')
+    jpeg.jpeg_set_num_threads(n)
 
 def jpeg_compress(image):
     """
     Compress an image using the JPEG shared library.
     """
+    jpeg = backends.require('jpeg')
     N = image.shape[0]
-    compressed = np.zeros(N * N, dtype=np.int32)
-    compressed_size = ctypes.c_int()
+    image = np.ascontiguousarray(image, dtype=np.float64)
+    compressed = np.zeros((_max_encoded_size(jpeg, N, N) + 3) // 4, dtype=np.int32)
+    compressed_size = ctypes.c_int(len(compressed))
 
     # Call the shared library function
-    jpeg.jpeg_compress(
+    _check_encode(jpeg.jpeg_compress(
         N,
         image.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
         compressed.ctypes.data_as(ctypes.POINTER(ctypes.c_int)),
         ctypes.byref(compressed_size)
-    )
+    ))
     return compressed[:compressed_size.value]
 
 def jpeg_decompress(compressed, N):
     """
     Decompress an image using the JPEG shared library.
     """
+    jpeg = backends.require('jpeg')
+    compressed = np.ascontiguousarray(compressed, dtype=np.int32)
     decompressed = np.zeros((N, N), dtype=np.float64)
 
     # Call the shared library function
@@ -53,9 +120,36 @@ def jpeg_decompress(compressed, N):
     )
     return decompressed
 
+def jpeg_encode(image, quality=50):
+    """
+    Encode a grayscale image (any size, values 0..255) into a byte stream; values
+    outside that range raise ValueError.
+    """
+    jpeg = backends.require('jpeg')
+    height, width = image.shape
+    image = np.ascontiguousarray(image, dtype=np.float64)
+    capacity = _max_encoded_size(jpeg, width, height)
+    out = np.empty(capacity, dtype=np.uint8)
+    size = _check_encode(jpeg.jpeg_encode_image(image, width, height, quality, out, capacity))
+    return out[:size].tobytes()
+
+def jpeg_decode(data):
+    """
+    Decode a byte stream from jpeg_encode into a float64 image.
+    """
+    jpeg = backends.require('jpeg')
+    buf = np.frombuffer(data, dtype=np.uint8)
+    width, height = ctypes.c_int(), ctypes.c_int()
+    if jpeg.jpeg_image_size(buf, len(buf), ctypes.byref(width), ctypes.byref(height)) != 0:
+        raise ValueError("not a jpeg_encode stream")
+    image = np.empty((height.value, width.value), dtype=np.float64)
+    if jpeg.jpeg_decode_image(buf, len(buf), image) != 0:
+        raise ValueError("corrupt jpeg_encode stream")
+    return image
+
 def main():
     # Example: Compress and decompress a 512x512 grayscale image
-    image = np.random.rand(512, 512).astype(np.float64)
+    image = np.random.randint(0, 256, (512, 512)).astype(np.float64)
 
     # Compress the image
     compressed = jpeg_compress(image)
@@ -64,6 +158,7 @@ def main():
     # Decompress the image
     decompressed = jpeg_decompress(compressed, 512)
     print("Decompression completed.")
+    print(f"PSNR: {10 * np.log10(255 ** 2 / np.mean((image - decompressed) ** 2)):.2f} dB")
 
 if __name__ == "__main__":
     main()
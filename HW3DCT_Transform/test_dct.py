@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from scipy.fft import dct, idct, dctn
+
+import dct as butterfly
+
+
+def _vectors():
+    return np.random.default_rng(0).normal(0, 100, (1000, 8))
+
+
+def test_butterfly_dct_matches_scipy():
+    x = _vectors()
+    np.testing.assert_allclose(butterfly.butterfly_dct_8(x), dct(x, norm='ortho'), rtol=0, atol=1e-12)
+
+
+def test_butterfly_idct_matches_scipy():
+    X = _vectors()
+    np.testing.assert_allclose(butterfly.butterfly_idct_8(X), idct(X, norm='ortho'), rtol=0, atol=1e-12)
+
+
+def test_dct_2d_butterfly_matches_blockwise_scipy():
+    img = np.random.default_rng(1).integers(0, 256, (64, 48)).astype(np.float64)
+    expected = dctn(img.reshape(8, 8, 6, 8).swapaxes(1, 2), axes=(2, 3), norm='ortho')
+    result = butterfly.dct_2d_butterfly(img).reshape(8, 8, 6, 8).swapaxes(1, 2)
+    # dct_2d_butterfly returns float32
+    np.testing.assert_allclose(result, expected, rtol=1e-6, atol=1e-4)
+    np.testing.assert_allclose(butterfly.idct_2d_butterfly(result.swapaxes(1, 2).reshape(64, 48)), img, atol=1e-3)
+
+
+def test_block_dct_roundtrip_on_odd_sized_image():
+    img = np.random.default_rng(2).integers(0, 256, (37, 53)).astype(np.float64)
+    coeffs = butterfly.Block_DCT(img)
+    assert coeffs.shape == (40, 56)
+    np.testing.assert_allclose(butterfly.Block_IDCT(coeffs, shape=img.shape), img, atol=1e-9)
+
+
+def test_block_idct_rejects_cropped_coefficients():
+    img = np.random.default_rng(2).integers(0, 256, (37, 53)).astype(np.float64)
+    with pytest.raises(ValueError):
+        butterfly.Block_IDCT(butterfly.Local_DCT(img))
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import backends
+import jpeg
+import jpeg_c
+
+native = pytest.mark.skipif(backends.library('jpeg') is None, reason="libjpeg.so is not built")
+
+
+def _images():
+    rng = np.random.default_rng(0)
+    yield rng.integers(0, 256, (512, 512)).astype(np.float64)
+    yield rng.integers(0, 256, (67, 133)).astype(np.float64)
+    # ramp with wrap-around edges and a flat block image
+    y, x = np.mgrid[:256, :256]
+    yield ((x + y) % 256).astype(np.float64)
+    yield np.full((64, 64), 128.0)
+
+
+@native
+def test_compress_image_matches_native():
+    for image in _images():
+        np.testing.assert_array_equal(jpeg._numpy_compress_image(image), jpeg._native_compress_image(image))
+
+
+@native
+def test_decompress_image_matches_native():
+    for image in _images():
+        height, width = image.shape
+        compressed = jpeg._native_compress_image(image)
+        np.testing.assert_array_equal(jpeg._numpy_decompress_image(compressed, width, height),
+                                      jpeg._native_decompress_image(compressed, width, height))
+
+
+def test_round_half_away_from_zero():
+    x = np.array([-2.5, -1.5, -0.5, -0.49999999999999994, 0.0, 0.49999999999999994, 0.5, 1.5, 2.5])
+    np.testing.assert_array_equal(jpeg._round_half_away(x), [-3, -2, -1, 0, 0, 0, 1, 2, 3])
+
+
+def _encoded():
+    image = np.random.default_rng(3).integers(0, 256, (45, 71)).astype(np.float64)
+    return jpeg_c.jpeg_encode(image)
+
+
+@native
+def test_decode_rejects_truncated_streams():
+    data = _encoded()
+    for size in (len(data) - 1, len(data) // 2, 20, 10, 0):
+        with pytest.raises(ValueError):
+            jpeg_c.jpeg_decode(data[:size])
+
+
+@native
+def test_decode_rejects_corrupt_headers_and_tables():
+    data = bytearray(_encoded())
+    corruptions = {
+        'magic': (0, b'XJPG'),
+        'version': (4, b'\x09'),
+        'zero width': (6, b'\x00\x00\x00\x00'),
+        'huge width': (6, b'\xff\xff\xff\xff'),
+        # a plausible size, but far more blocks than the stream could hold
+        'too many blocks': (6, b'\x60\xea\x00\x00\x60\xea\x00\x00'),
+        'code length counts': (14, b'\xff' * 16),
+    }
+    for offset, patch in corruptions.values():
+        corrupt = bytearray(data)
+        corrupt[offset:offset + len(patch)] = patch
+        with pytest.raises(ValueError):
+            jpeg_c.jpeg_decode(bytes(corrupt))
+
+
+def _smooth(height, width):
+    y, x = np.mgrid[:height, :width]
+    return np.clip(128 + 60 * np.sin(x / 9.0) + 40 * np.cos(y / 13.0), 0, 255)
+
+
+@native
+@pytest.mark.parametrize('shape', [(1, 1), (7, 9), (37, 53), (67, 133), (255, 257)])
+def test_encode_decode_roundtrip_on_odd_sizes(shape):
+    image = _smooth(*shape)
+    decoded = jpeg_c.jpeg_decode(jpeg_c.jpeg_encode(image, quality=50))
+    assert decoded.shape == image.shape
+    mse = np.mean((decoded - image) ** 2)
+    assert mse == 0 or 10 * np.log10(255 ** 2 / mse) > 40
+
+
+@native
+def test_encoded_stream_does_not_depend_on_thread_count():
+    images = [np.random.default_rng(4).integers(0, 256, (517, 301)).astype(np.float64), _smooth(67, 133)]
+    try:
+        jpeg_c.set_num_threads(1)
+        expected = [jpeg_c.jpeg_encode(image) for image in images]
+        for threads in (2, 3, 4, 7, 0):
+            jpeg_c.set_num_threads(threads)
+            assert [jpeg_c.jpeg_encode(image) for image in images] == expected
+    finally:
+        jpeg_c.set_num_threads(0)
@@ -0,0 +1,202 @@
+import struct
+import zlib
+import numpy as np
+
+from dwt_c import perform_multilevel_dwt, perform_multilevel_idwt, pyramid_bands
+
+MAGIC = b'WVLT'
+VERSION = 1
+_header = struct.Struct('<4sBIIB')  # magic, version, height, width, levels
+
+
+def band_steps(levels, step=8.0, ll_step=None):
+    """
+    Quantizer step of every sub-band in stream order: LL, then (LH, HL, HH) from the
+    coarsest level to level 1. The transform is orthonormal, so one step for all detail
+    bands spreads the error evenly; LL gets a finer step (step / 4 by default).
+    """
+    ll_step = step / 4 if ll_step is None else ll_step
+    return np.array([ll_step] + [step] * (3 * levels), dtype=np.float32)
+
+
+def dead_zone_quantize(coeffs, step):
+    """
+    Uniform quantizer with a dead zone of width 2 * step around zero.
+    """
+    return (np.sign(coeffs) * np.floor(np.abs(coeffs) / step)).astype(np.int64)
+
+
+def dead_zone_dequantize(q, step):
+    """
+    Midpoint reconstruction of dead_zone_quantize; zeros stay zero.
+    """
+    return np.sign(q) * (np.abs(q) + 0.5) * step
+
+
+def _varint_encode(values):
+    """
+    LEB128 varints of non-negative integers, vectorized.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    owner = np.repeat(np.arange(len(values)), nbytes)
+    pos = np.arange(nbytes.sum()) - starts[owner]
+    out = ((values[owner] >> (7 * pos).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    out[pos < nbytes[owner] - 1] |= 0x80
+    return out.tobytes()
+
+
+def _varint_decode(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    pos = np.arange(ends[-1] + 1) - starts[owner]
+    parts = (data[:ends[-1] + 1] & 0x7F).astype(np.uint64) << (7 * pos).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _unzigzag(values):
+    values = values.astype(np.int64)
+    return (values >> 1) ^ -(values & 1)
+
+
+def _encode_detail(q):
+    """
+    Run-length code of a quantized detail band: the number of non-zero coefficients,
+    the zero runs before each of them, then their values.
+    """
+    flat = q.ravel()
+    nonzero = np.flatnonzero(flat)
+    runs = np.diff(nonzero, prepend=-1) - 1
+    return _varint_encode(np.concatenate(([len(nonzero)], runs, _zigzag(flat[nonzero]))))
+
+
+def _decode_detail(symbols, offset, shape):
+    count = int(symbols[offset])
+    runs = symbols[offset + 1:offset + 1 + count].astype(np.int64)
+    values = _unzigzag(symbols[offset + 1 + count:offset + 1 + 2 * count])
+    q = np.zeros(shape[0] * shape[1], dtype=np.int64)
+    q[np.cumsum(runs + 1) - 1] = values
+    return q.reshape(shape), offset + 1 + 2 * count
+
+
+def encode(image, levels=2, step=8.0, ll_step=None):
+    """
+    Compress a grayscale image with an L-level Haar DWT (native kernel), dead-zone
+    quantization per sub-band and run-length coding of the detail bands.
+
+    Stream: header (magic, version, height, width, levels), the float32 step of every
+    sub-band, the byte length of every segment, then the segments in level order:
+    LL_L, the details of level L, ..., the details of level 1. The first k + 1 segments
+    are all a decoder needs for a preview reduced by 2^(L - k).
+    """
+    height, width = image.shape
+    pyramid = perform_multilevel_dwt(image, levels)
+    LL, details = pyramid_bands(pyramid, levels)
+    levels = len(details)
+    steps = band_steps(levels, step, ll_step)
+
+    q = dead_zone_quantize(LL, steps[0])
+    segments = [zlib.compress(_varint_encode(_zigzag(np.diff(q.ravel(), prepend=0))))]
+    for i, bands in enumerate(reversed(details)):
+        chunks = [_encode_detail(dead_zone_quantize(band, steps[1 + 3 * i + k])) for k, band in enumerate(bands)]
+        segments.append(zlib.compress(b''.join(chunks)))
+
+    table = struct.pack(f'<{levels + 1}I', *(len(s) for s in segments))
+    return _header.pack(MAGIC, VERSION, height, width, levels) + steps.tobytes() + table + b''.join(segments)
+
+
+def _read_layout(read):
+    """
+    Header fields, steps and segment lengths, reading through read(n) -> bytes.
+    """
+    magic, version, height, width, levels = _header.unpack(read(_header.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a wavelet_codec stream")
+    steps = np.frombuffer(read(4 * (1 + 3 * levels)), dtype=np.float32)
+    lengths = struct.unpack(f'<{levels + 1}I', read(4 * (levels + 1)))
+    return height, width, levels, steps, lengths
+
+
+def _level_shapes(height, width, levels):
+    shapes = [(height, width)]
+    for _ in range(levels):
+        h, w = shapes[-1]
+        shapes.append(((h + 1) // 2, (w + 1) // 2))
+    return shapes
+
+
+def _decode_segments(height, width, levels, steps, segments, reduce):
+    """
+    Image at 1 / 2^reduce of the full resolution from the first levels - reduce + 1 segments.
+    """
+    shapes = _level_shapes(height, width, levels)
+    used = levels - reduce
+    h, w = shapes[reduce]
+    pyramid = np.zeros((h, w))
+
+    LL_shape = shapes[levels]
+    q = np.cumsum(_unzigzag(_varint_decode(zlib.decompress(segments[0]))))
+    pyramid[:LL_shape[0], :LL_shape[1]] = dead_zone_dequantize(q.reshape(LL_shape), steps[0])
+
+    for i in range(used):
+        level = levels - i
+        (ph, pw), (lh, lw) = shapes[level - 1], shapes[level]
+        symbols = _varint_decode(zlib.decompress(segments[1 + i]))
+        offset = 0
+        regions = [(slice(lh, ph), slice(0, lw)), (slice(0, lh), slice(lw, pw)), (slice(lh, ph), slice(lw, pw))]
+        for k, (rows, cols) in enumerate(regions):
+            band, offset = _decode_detail(symbols, offset, (rows.stop - rows.start, cols.stop - cols.start))
+            pyramid[rows, cols] = dead_zone_dequantize(band, steps[1 + 3 * i + k])
+
+    # the LL of level `reduce` is 2^reduce times the local mean
+    return perform_multilevel_idwt(pyramid, used) / 2 ** reduce
+
+
+def decode(data, reduce=0):
+    """
+    Decode a stream from encode(). reduce = r > 0 gives a preview at 1 / 2^r of the
+    full resolution (r <= levels) using only the stream prefix up to the details of
+    level r + 1.
+    """
+    view = memoryview(data)
+    pos = 0
+
+    def take(n):
+        nonlocal pos
+        pos += n
+        return bytes(view[pos - n:pos])
+
+    height, width, levels, steps, lengths = _read_layout(take)
+    if not 0 <= reduce <= levels:
+        raise ValueError(f"reduce must be between 0 and {levels}")
+    segments = [take(n) for n in lengths[:levels - reduce + 1]]
+    return _decode_segments(height, width, levels, steps, segments, reduce)
+
+
+def write(path, image, levels=2, step=8.0, ll_step=None):
+    with open(path, 'wb') as f:
+        f.write(encode(image, levels, step, ll_step))
+
+
+def read(path, reduce=0):
+    """
+    Decode a file written by write(), reading only the bytes the requested resolution needs.
+    """
+    with open(path, 'rb') as f:
+        height, width, levels, steps, lengths = _read_layout(f.read)
+        if not 0 <= reduce <= levels:
+            raise ValueError(f"reduce must be between 0 and {levels}")
+        segments = [f.read(n) for n in lengths[:levels - reduce + 1]]
+    return _decode_segments(height, width, levels, steps, segments, reduce)
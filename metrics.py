@@ -0,0 +1,104 @@
+import numpy as np
+from scipy.ndimage import uniform_filter
+
+from mmap_io import row_strips
+
+chunk_pixels = 1 << 20  # pixels of float64 scratch per chunk and candidate batch
+
+
+def _as_batch(images):
+    images = np.asarray(images)
+    if images.ndim == 2:
+        return images[np.newaxis], True
+    return images, False
+
+
+def _chunk_rows(n, width, chunk_rows):
+    if chunk_rows is not None:
+        return chunk_rows
+    return max(1, chunk_pixels // max(1, n * width))
+
+
+def _result(values, single):
+    return float(values[0]) if single else values
+
+
+def squared_error_sums(reference, candidates, chunk_rows=None):
+    """
+    Sum of squared differences of each candidate against the reference.
+    `reference` is H x W (shared by all candidates) or N x H x W (pairwise); `candidates`
+    is H x W or N x H x W. Differences are taken in float64 over row chunks, so uint8
+    inputs do not wrap around and no full-size temporaries are allocated.
+    """
+    reference = np.asarray(reference)
+    candidates, _ = _as_batch(candidates)
+    n, height, width = candidates.shape
+
+    sums = np.zeros(n)
+    for start, stop in row_strips(height, _chunk_rows(n, width, chunk_rows)):
+        diff = candidates[:, start:stop].astype(np.float64)
+        diff -= reference[..., start:stop, :]
+        sums += np.einsum('nij,nij->n', diff, diff)
+    return sums
+
+
+def mse(reference, candidates, chunk_rows=None):
+    """
+    Mean squared error of one candidate (float) or a batch of candidates (array).
+    """
+    _, single = _as_batch(candidates)
+    height, width = np.shape(candidates)[-2:]
+    return _result(squared_error_sums(reference, candidates, chunk_rows) / (height * width), single)
+
+
+def psnr(reference, candidates, max_pixel=255.0, chunk_rows=None):
+    """
+    PSNR in dB of one candidate (float) or a batch of candidates (array); inf for identical images.
+    """
+    _, single = _as_batch(candidates)
+    height, width = np.shape(candidates)[-2:]
+    errors = squared_error_sums(reference, candidates, chunk_rows) / (height * width)
+    with np.errstate(divide='ignore'):
+        values = 10 * np.log10((max_pixel ** 2) / errors)
+    return _result(values, single)
+
+
+def ssim(reference, candidates, data_range=255.0, win_size=7, chunk_rows=None):
+    """
+    Mean SSIM of one candidate (float) or a batch of candidates (array), using a
+    uniform win_size window and sample covariances over the windows that fit inside
+    the image. Rows are processed in chunks with a win_size // 2 halo; the reference
+    statistics are computed once per chunk for all candidates.
+    """
+    reference = np.asarray(reference)
+    candidates, single = _as_batch(candidates)
+    n, height, width = candidates.shape
+    pad = win_size // 2
+    if win_size < 3 or win_size % 2 == 0:
+        raise ValueError(f"win_size must be odd and at least 3 for SSIM, got {win_size}")
+    if height < win_size or width < win_size:
+        raise ValueError(f"images must be at least {win_size}x{win_size} for SSIM")
+
+    cov_norm = win_size ** 2 / (win_size ** 2 - 1)
+    C1 = (0.01 * data_range) ** 2
+    C2 = (0.03 * data_range) ** 2
+    size = (1, win_size, win_size)
+
+    totals = np.zeros(n)
+    rows = _chunk_rows(n, width, chunk_rows)
+    for start, stop in row_strips(height - 2 * pad, rows):
+        x = reference[..., start:stop + 2 * pad, :].astype(np.float64)
+        y = candidates[:, start:stop + 2 * pad].astype(np.float64)
+        if x.ndim == 2:
+            x = x[np.newaxis]
+
+        ux = uniform_filter(x, size=size)
+        uy = uniform_filter(y, size=size)
+        vx = cov_norm * (uniform_filter(x * x, size=size) - ux * ux)
+        vy = cov_norm * (uniform_filter(y * y, size=size) - uy * uy)
+        vxy = cov_norm * (uniform_filter(x * y, size=size) - ux * uy)
+
+        S = ((2 * ux * uy + C1) * (2 * vxy + C2)) / ((ux * ux + uy * uy + C1) * (vx + vy + C2))
+        totals += S[:, pad:S.shape[1] - pad, pad:width - pad].sum(axis=(1, 2))
+
+    return _result(totals / ((height - 2 * pad) * (width - 2 * pad)), single)
@@ -0,0 +1,28 @@
+import numpy as np
+
+
+def open_image(path, shape=None, dtype=np.uint8):
+    """
+    Memory-map an image for reading.
+    .npy files carry their own shape and dtype; raw files need `shape` (and `dtype`).
+    """
+    if shape is None:
+        return np.load(path, mmap_mode='r')
+    return np.memmap(path, dtype=dtype, mode='r', shape=tuple(shape))
+
+
+def create_image(path, shape, dtype=np.uint8):
+    """
+    Create a memory-mapped output image, as .npy if the path ends with .npy and raw otherwise.
+    """
+    if str(path).endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=tuple(shape))
+    return np.memmap(path, dtype=dtype, mode='w+', shape=tuple(shape))
+
+
+def row_strips(height, strip_height):
+    """
+    (start, stop) row ranges of consecutive strips covering `height` rows.
+    """
+    for start in range(0, height, strip_height):
+        yield start, min(height, start + strip_height)